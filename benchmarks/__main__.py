@@ -0,0 +1,72 @@
+"""Runs the offline benchmarks and writes the results to JSON.
+
+Usage: `python -m benchmarks [--output results.json] [suite ...]`, by default results go to
+.tmp/benchmarks/<commit>.json, so runs of different commits can be compared.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from benchmarks import auto_replies, download, extraction, message, queue, settings, startup, system
+
+SUITES: dict[str, Callable[[], dict[str, Any]]] = {
+    "queue": queue.run,
+    "download": download.run,
+    "message": message.run,
+    "system": system.run,
+    "auto_replies": auto_replies.run,
+    "settings": settings.run,
+    "startup": startup.run,
+    "extraction": extraction.run,
+}
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run offline benchmarks")
+    parser.add_argument("suites", nargs="*", help=f"suites to run: {', '.join(SUITES)}, all by default")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if unknown := set(args.suites) - set(SUITES):
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    commit = get_commit()
+    output = args.output or Path(".tmp", "benchmarks", f"{commit or 'unknown'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    report: dict[str, Any] = {
+        "commit": commit,
+        "python": platform.python_version(),
+        "started_at": time.time(),
+        "results": {},
+    }
+
+    for name in args.suites or SUITES:
+        started_at = time.perf_counter()
+        report["results"][name] = SUITES[name]()
+        print(f"{name}: {time.perf_counter() - started_at:.1f}s")  # noqa: T201
+
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results are written to {output}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
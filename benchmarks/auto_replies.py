@@ -0,0 +1,87 @@
+"""Compares the auto-reply matcher with checking the rules one by one.
+
+Run with `python -m benchmarks.auto_replies`.
+"""
+
+import random
+import string
+import time
+
+from core.models import AutoReply
+from services.auto_reply import AutoReplyMatcher
+
+RULE_COUNTS = (10, 100, 1_000, 5_000)
+MESSAGE_COUNT = 2_000
+SEED = 42
+
+
+def make_word(rnd: random.Random) -> str:
+    return "".join(rnd.choices(string.ascii_lowercase + "абвгдеёжзийклмнопрстуфхцчшщъыьэюя", k=rnd.randint(3, 10)))
+
+
+def make_rules(rnd: random.Random, count: int) -> dict[str, AutoReply]:
+    rules: dict[str, AutoReply] = {}
+    while len(rules) < count:
+        phrase = " ".join(make_word(rnd) for _ in range(rnd.randint(1, 3)))
+        rules[phrase] = AutoReply(text=phrase, image_name="image.png")
+
+    return rules
+
+
+def make_messages(rnd: random.Random, rules: dict[str, AutoReply]) -> list[str]:
+    phrases = list(rules)
+    messages = []
+    for i in range(MESSAGE_COUNT):
+        words = [make_word(rnd) for _ in range(rnd.randint(3, 30))]
+        # Every tenth message triggers some rule
+        if i % 10 == 0:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(phrases).upper())
+        messages.append(" ".join(words))
+
+    return messages
+
+
+def match_naive(rules: dict[str, AutoReply], content: str) -> AutoReply | None:
+    for text, auto_reply in rules.items():
+        if text.lower().strip() in content.lower().strip():
+            return auto_reply
+
+    return None
+
+
+def run() -> dict[str, dict[str, float]]:
+    rnd = random.Random(SEED)  # noqa: S311
+    results = {}
+
+    for count in RULE_COUNTS:
+        rules = make_rules(rnd, count)
+        messages = make_messages(rnd, rules)
+
+        started_at = time.perf_counter()
+        matcher = AutoReplyMatcher(rules)
+        build_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        expected = [match_naive(rules, message) for message in messages]
+        naive_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        matched = [matcher.match(message) for message in messages]
+        matcher_time = time.perf_counter() - started_at
+
+        if matched != expected:
+            msg = f"Matcher result differs from the naive one for {count} rules"
+            raise RuntimeError(msg)
+
+        results[f"rules_{count}"] = {
+            "build_ms": build_time * 1000,
+            "naive_us_per_message": naive_time / MESSAGE_COUNT * 1_000_000,
+            "matcher_us_per_message": matcher_time / MESSAGE_COUNT * 1_000_000,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, ", ".join(f"{key}={value:.2f}" for key, value in result.items()))  # noqa: T201
@@ -0,0 +1,42 @@
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+Result = dict[str, float]
+
+REPEAT = 5
+
+
+def measure(func: Callable[[], object], number: int = 1, repeat: int = REPEAT) -> Result:
+    """Runs func `number` times per round and reports per call timings of the rounds."""
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started_at) / number)
+
+    return _to_result(timings, number)
+
+
+def measure_async(func: Callable[[], Awaitable[object]], number: int = 1, repeat: int = REPEAT) -> Result:
+    async def run_rounds() -> list[float]:
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            for _ in range(number):
+                await func()
+            timings.append((time.perf_counter() - started_at) / number)
+
+        return timings
+
+    return _to_result(asyncio.run(run_rounds()), number)
+
+
+def _to_result(timings: list[float], number: int) -> Result:
+    return {
+        "min_us": min(timings) * 1_000_000,
+        "median_us": statistics.median(timings) * 1_000_000,
+        "calls": number,
+    }
@@ -0,0 +1,74 @@
+import asyncio
+import tempfile
+import uuid
+from functools import partial
+from pathlib import Path
+
+from benchmarks.common import Result, measure_async
+from core.models import Track
+from services.download import DownloadService
+from services.source_cache import SourceCache
+
+SOURCES = {
+    "youtube": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "yandex_music": "https://music.yandex.by/album/1/track/2",
+    "spotify": "https://open.spotify.com/track/1",
+    "search": "some track name",
+}
+
+
+class StubDownloader:
+    async def download(
+        self,
+        source: str,
+        *,
+        only_one: bool = True,  # noqa: ARG002
+        force_load_first: bool = False,  # noqa: ARG002
+        urgent: bool = True,  # noqa: ARG002
+    ) -> list[Track]:
+        return [Track(id=source, title=source, link=source, duration=0, uuid=uuid.uuid4())]
+
+    async def batch_download_by_track_names(
+        self,
+        track_names: list[str],
+        *,
+        force_load_first: bool = False,  # noqa: ARG002
+        urgent: bool = True,  # noqa: ARG002
+    ) -> list[Track]:
+        return [Track(id=name, title=name, link=name, duration=0, uuid=uuid.uuid4()) for name in track_names]
+
+
+class StubSpotifyLoader:
+    async def get_track_names(self, source: str) -> list[str]:
+        return [source]
+
+
+def run() -> dict[str, Result]:
+    with tempfile.TemporaryDirectory() as directory:
+        source_cache = SourceCache(cache_dir=Path(directory))
+        download_service = DownloadService(
+            yt_downloader=StubDownloader(),  # type: ignore[arg-type]
+            ym_downloader=StubDownloader(),  # type: ignore[arg-type]
+            spotify_loader=StubSpotifyLoader(),  # type: ignore[arg-type]
+            source_cache=source_cache,
+        )
+
+        # Stub tracks have no files, so every route misses the source cache
+        results = {
+            f"route_{name}": measure_async(partial(download_service.download, source), number=2_000)
+            for name, source in SOURCES.items()
+        }
+
+        Path(directory, "dQw4w9WgXcQ.opus").touch()
+        track = Track(id="dQw4w9WgXcQ", title="", link="", duration=0, uuid=uuid.uuid4(), file_extension=".opus")
+
+        async def put() -> None:
+            source_cache.put(SOURCES["youtube"], [track])
+
+        asyncio.run(put())
+        results["source_cache_hit"] = measure_async(
+            partial(download_service.download, SOURCES["youtube"]),
+            number=2_000,
+        )
+
+    return results
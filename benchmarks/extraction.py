@@ -0,0 +1,161 @@
+"""Concurrent playlist resolution with extraction in threads versus worker processes.
+
+Network is left out: yt-dlp processes synthetic playlists with many formats per video, which is the CPU heavy
+part of extraction. Meanwhile a thread wakes up every 20 ms like discord.py's audio sender and its lateness
+shows how much the extraction holds the GIL.
+
+Usage: `python -m benchmarks.extraction`
+"""
+
+import asyncio
+import json
+import multiprocessing
+import pickle
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from services.music_downloaders.youtube import SourceInfo, create_client, to_source_info
+
+SEED = 1
+WORKERS = 4
+PLAYLISTS = 8
+PLAYLIST_SIZE = 20
+FORMATS_PER_VIDEO = 40
+FRAME_INTERVAL = 0.02
+
+_client: Any = None
+
+
+def init_worker(cache_dir: Path) -> None:
+    global _client  # noqa: PLW0603
+    _client = create_client(cache_dir)
+
+
+def is_worker_ready() -> bool:
+    return _client is not None
+
+
+def make_video(index: int, rnd: random.Random) -> dict[str, Any]:
+    formats = []
+    for i in range(FORMATS_PER_VIDEO):
+        is_audio = i % 3 == 0
+        formats.append(
+            {
+                "format_id": str(i),
+                "url": f"https://example.com/{index}/{i}",
+                "ext": "webm" if i % 2 else "m4a",
+                "acodec": "opus",
+                "vcodec": "none" if is_audio else "vp9",
+                "abr": rnd.randint(32, 160),
+                "tbr": rnd.randint(50, 5000),
+                "height": None if is_audio else rnd.choice((144, 360, 720, 1080)),
+                "filesize": rnd.randint(100_000, 100_000_000),
+                "protocol": "https",
+            }
+        )
+
+    return {
+        "_type": "video",
+        "id": f"video{index}",
+        "title": f"Video {index}",
+        "duration": rnd.randint(60, 600),
+        "formats": formats,
+        "webpage_url": f"https://www.youtube.com/watch?v=video{index}",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+    }
+
+
+def make_playlist(seed: int) -> dict[str, Any]:
+    rnd = random.Random(seed)  # noqa: S311
+
+    return {
+        "_type": "playlist",
+        "id": f"playlist{seed}",
+        "title": f"Playlist {seed}",
+        "entries": [make_video(i, rnd) for i in range(PLAYLIST_SIZE)],
+        "webpage_url": f"https://www.youtube.com/playlist?list=playlist{seed}",
+        "extractor": "youtube:tab",
+        "extractor_key": "YoutubeTab",
+    }
+
+
+def resolve_playlist(seed: int) -> SourceInfo:
+    return to_source_info(_client.process_ie_result(make_playlist(seed), download=False))
+
+
+class AudioThread(threading.Thread):
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self._stopped = threading.Event()
+        self.lateness: list[float] = []
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            wake_up_at = time.perf_counter() + FRAME_INTERVAL
+            time.sleep(FRAME_INTERVAL)
+            self.lateness.append(max(time.perf_counter() - wake_up_at, 0))
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+async def resolve_playlists(executor: Executor) -> dict[str, float]:
+    loop = asyncio.get_running_loop()
+    # Workers are spawned on demand and import yt-dlp, which isn't part of a resolution
+    await asyncio.gather(*(loop.run_in_executor(executor, is_worker_ready) for _ in range(WORKERS)))
+
+    audio_thread = AudioThread()
+    audio_thread.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(loop.run_in_executor(executor, resolve_playlist, seed) for seed in range(PLAYLISTS)))
+    wall_time = time.perf_counter() - started_at
+    audio_thread.stop()
+
+    lateness = sorted(audio_thread.lateness)
+
+    return {
+        "wall_ms": wall_time * 1000,
+        "audio_lateness_median_ms": statistics.median(lateness) * 1000,
+        "audio_lateness_p99_ms": lateness[int(len(lateness) * 0.99)] * 1000,
+        "audio_lateness_max_ms": lateness[-1] * 1000,
+        "late_frames": sum(i > FRAME_INTERVAL for i in lateness),
+    }
+
+
+def run() -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        cache_dir = Path(directory)
+
+        # Threads share one client like YouTubeDownloader does without extraction processes
+        init_worker(cache_dir)
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            threads = asyncio.run(resolve_playlists(executor))
+
+        with ProcessPoolExecutor(
+            max_workers=WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(cache_dir,),
+        ) as executor:
+            processes = asyncio.run(resolve_playlists(executor))
+
+        info = _client.process_ie_result(make_playlist(0), download=False)
+
+    return {
+        "threads": threads,
+        "processes": processes,
+        "info_pickle_bytes": len(pickle.dumps(info)),
+        "record_pickle_bytes": len(pickle.dumps(to_source_info(info))),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))  # noqa: T201
@@ -0,0 +1,480 @@
+"""End-to-end load harness: N simulated guilds drive MusicService with play, skip, queue and volume commands.
+
+Discord is replaced by in-process stand-ins: a context which collects sent messages, a voice client which
+consumes AudioSource.read() at the real 20 ms cadence in its own thread and stub providers with simulated
+latency. Playback goes through the real Player, so ffmpeg must be installed.
+
+Usage: `python -m benchmarks.load --guilds 10 --duration 60 [--output report.json]`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from contextlib import suppress
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import psutil
+from discord import AudioSource, opus
+
+from config.settings import Settings
+from core.logging import logger
+from core.metrics import FFMPEG_REJECTIONS
+from core.models import Track
+from services.download import DownloadService
+from services.download_pool import DownloadPool
+from services.ffmpeg_governor import MAX_PROCESSES, FFmpegGovernor
+from services.message import MessageService
+from services.music import MusicService
+from services.play_history import PlayHistory
+from services.player import Player
+from services.presence import PresenceManager
+from services.queue import QueueManager
+from services.source_cache import SourceCache
+
+FRAME_DURATION = 0.02
+# A frame sent later than this is an audible hiccup for listeners
+DEADLINE_SLACK = 0.02
+TRACK_COUNT = 20
+# Distinct sources users play, repeated ones are served by the source cache
+SOURCE_COUNT = 100
+TRACK_DURATION = 600
+COMMAND_WEIGHTS = {"play": 4, "skip": 2, "queue": 2, "volume": 2}
+
+
+class FakeMessage:
+    def __init__(self) -> None:
+        self.id = random.getrandbits(63)
+        self.attachments: list = []
+
+    async def edit(self, **_: Any) -> None:  # noqa: ANN401
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.sent_messages = 0
+
+    async def send(self, **_: Any) -> FakeMessage:  # noqa: ANN401
+        self.sent_messages += 1
+
+        return FakeMessage()
+
+
+class FakeContext:
+    def __init__(self, channel: FakeChannel) -> None:
+        self.channel = channel
+        self.author = SimpleNamespace(id=1, name="load-tester")
+
+    async def send(self, **kwargs: Any) -> FakeMessage:  # noqa: ANN401
+        return await self.channel.send(**kwargs)
+
+
+class FakeClient:
+    async def change_presence(self, **_: Any) -> None:  # noqa: ANN401
+        pass
+
+
+def make_encoder() -> opus.Encoder | None:
+    try:
+        return opus.Encoder()
+    except opus.OpusNotLoaded:
+        return None
+
+
+class FakeAudioPlayer(threading.Thread):
+    """Mimics discord.py AudioPlayer: reads a frame every 20 ms and encodes it when opus is available."""
+
+    def __init__(
+        self,
+        source: AudioSource,
+        after: Callable[[Exception | None], None] | None,
+        stats: "GuildStats",
+    ) -> None:
+        super().__init__(daemon=True)
+        self.source = source
+        self.loops = 0
+        self._after = after
+        self._stats = stats
+        self._stopped = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._encoder = make_encoder()
+
+    def run(self) -> None:
+        error = None
+        started_at = time.perf_counter()
+
+        try:
+            while not self._stopped.is_set():
+                if not self._resumed.is_set():
+                    self._resumed.wait()
+                    self.loops = 0
+                    started_at = time.perf_counter()
+                    continue
+
+                data = self.source.read()
+                if not data:
+                    break
+
+                if self._encoder is not None:
+                    self._encoder.encode(data, self._encoder.SAMPLES_PER_FRAME)
+
+                self.loops += 1
+                self._stats.frames += 1
+                next_time = started_at + FRAME_DURATION * self.loops
+                delay = next_time - time.perf_counter()
+
+                if delay > 0:
+                    time.sleep(delay)
+                elif -delay > DEADLINE_SLACK:
+                    self._stats.deadline_misses += 1
+        except Exception as e:  # noqa: BLE001
+            error = e
+        finally:
+            if self._after is not None:
+                self._after(error)
+            self.source.cleanup()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._resumed.set()
+
+    def pause(self) -> None:
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+
+class FakeVoiceClient:
+    def __init__(self, guild_id: int, client: FakeClient, loop: asyncio.AbstractEventLoop, stats: "GuildStats") -> None:
+        self.guild = SimpleNamespace(id=guild_id)
+        self.client = client
+        self.loop = loop
+        self._player: FakeAudioPlayer | None = None
+        self._stats = stats
+
+    def play(self, source: AudioSource, *, after: Callable[[Exception | None], None] | None = None) -> None:
+        self._player = FakeAudioPlayer(source, after, self._stats)
+        self._player.start()
+
+    def stop(self) -> None:
+        if self._player is not None:
+            self._player.stop()
+            self._player = None
+
+    def pause(self) -> None:
+        if self._player is not None:
+            self._player.pause()
+
+    def resume(self) -> None:
+        if self._player is not None:
+            self._player.resume()
+
+    def is_connected(self) -> bool:
+        return True
+
+
+class StubProvider:
+    """Resolves any source to cached tracks after a simulated network delay."""
+
+    def __init__(self, rnd: random.Random, latency: tuple[float, float]) -> None:
+        self._rnd = rnd
+        self._latency = latency
+
+    async def download(
+        self,
+        source: str,  # noqa: ARG002
+        *,
+        only_one: bool = True,  # noqa: ARG002
+        force_load_first: bool = False,  # noqa: ARG002
+        urgent: bool = True,  # noqa: ARG002
+    ) -> list[Track]:
+        await asyncio.sleep(self._rnd.uniform(*self._latency))
+
+        return [self._make_track()]
+
+    async def batch_download_by_track_names(
+        self,
+        track_names: list[str],
+        *,
+        force_load_first: bool = False,  # noqa: ARG002
+        urgent: bool = True,  # noqa: ARG002
+    ) -> list[Track]:
+        await asyncio.sleep(self._rnd.uniform(*self._latency))
+
+        return [self._make_track() for _ in track_names]
+
+    async def get_track_names(self, source: str) -> list[str]:
+        await asyncio.sleep(self._rnd.uniform(*self._latency))
+
+        return [source]
+
+    def _make_track(self) -> Track:
+        track_id = f"track-{self._rnd.randrange(TRACK_COUNT)}"
+
+        return Track(
+            id=track_id,
+            title=track_id,
+            link=f"https://www.youtube.com/watch?v={track_id}",
+            duration=TRACK_DURATION,
+            uuid=uuid.uuid4(),
+            file_extension=".opus",
+        )
+
+
+class GuildStats:
+    def __init__(self) -> None:
+        self.frames = 0
+        self.deadline_misses = 0
+        self.errors = 0
+        self.latencies: dict[str, list[float]] = {command: [] for command in COMMAND_WEIGHTS}
+
+
+def prepare_cache(cache_dir: Path) -> None:
+    sample = cache_dir / "sample.opus"
+    subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:duration={TRACK_DURATION}",
+            "-c:a",
+            "libopus",
+            str(sample),
+        ],
+        check=True,
+    )
+
+    for i in range(TRACK_COUNT):
+        os.link(sample, cache_dir / f"track-{i}.opus")
+
+
+async def drive_guild(  # noqa: PLR0913
+    *,
+    guild_id: int,
+    settings: Settings,
+    client: FakeClient,
+    presence_manager: PresenceManager,
+    source_cache: SourceCache,
+    ffmpeg_governor: FFmpegGovernor,
+    download_pool: DownloadPool,
+    play_history: PlayHistory,
+    deadline: float,
+    rnd: random.Random,
+    args: argparse.Namespace,
+) -> GuildStats:
+    loop = asyncio.get_running_loop()
+    stats = GuildStats()
+    voice_client = FakeVoiceClient(guild_id, client, loop, stats)
+    provider = StubProvider(rnd, (args.provider_latency_min, args.provider_latency_max))
+    music_service = MusicService(
+        voice_client=voice_client,  # type: ignore[arg-type]
+        queue_manager=QueueManager(),
+        player=Player(
+            voice_client=voice_client,  # type: ignore[arg-type]
+            settings=settings,
+            ffmpeg_governor=ffmpeg_governor,
+            download_pool=download_pool,
+        ),
+        download_service=DownloadService(
+            yt_downloader=provider,  # type: ignore[arg-type]
+            ym_downloader=provider,  # type: ignore[arg-type]
+            spotify_loader=provider,  # type: ignore[arg-type]
+            source_cache=source_cache,
+        ),
+        message_service=MessageService(),
+        presence_manager=presence_manager,
+        play_history=play_history,
+        settings=settings,
+    )
+    ctx = FakeContext(FakeChannel(guild_id))
+    commands, weights = zip(*COMMAND_WEIGHTS.items(), strict=True)
+
+    while loop.time() < deadline:
+        command = rnd.choices(commands, weights)[0]
+        started_at = loop.time()
+
+        # The bot reports command errors to the channel and keeps going, so does the harness
+        try:
+            if command == "play":
+                await music_service.play(source=f"track {rnd.randrange(SOURCE_COUNT)}", ctx=ctx, start_time=None)  # type: ignore[arg-type]
+            elif command == "skip":
+                await music_service.next(ctx)  # type: ignore[arg-type]
+            elif command == "queue":
+                await music_service.show_queue(ctx)  # type: ignore[arg-type]
+            else:
+                await music_service.set_music_parameters(ctx, volume_value=rnd.randint(10, 100))  # type: ignore[arg-type]
+        except Exception:  # noqa: BLE001
+            stats.errors += 1
+            logger.exception("Command %s failed in guild %s", command, guild_id)
+
+        stats.latencies[command].append(loop.time() - started_at)
+        await asyncio.sleep(rnd.expovariate(1 / args.think_time))
+
+    await music_service.stop(ctx)  # type: ignore[arg-type]
+
+    return stats
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {"count": len(values)}
+
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+
+    return {
+        "count": len(values),
+        "p50_ms": quantiles[49] * 1000,
+        "p90_ms": quantiles[89] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+async def sample_resources(process: psutil.Process, samples: list[dict[str, float]], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        rss = process.memory_info().rss
+        children_rss = 0
+        for child in process.children(recursive=True):
+            try:
+                children_rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+        samples.append({"rss_mb": rss / 2**20, "children_rss_mb": children_rss / 2**20})
+
+        with suppress(TimeoutError):
+            await asyncio.wait_for(stop.wait(), 1)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    rnd = random.Random(args.seed)  # noqa: S311
+    settings = Settings()
+    settings.cached_music_dir = Path.cwd()
+    prepare_cache(settings.cached_music_dir)
+
+    client = FakeClient()
+    presence_manager = PresenceManager(client)  # type: ignore[arg-type]
+    source_cache = SourceCache(cache_dir=settings.cached_music_dir)
+    ffmpeg_governor = FFmpegGovernor(max_processes=args.max_ffmpeg)
+    download_pool = DownloadPool()
+    play_history = PlayHistory(cache_dir=settings.cached_music_dir)
+    process = psutil.Process()
+    resource_samples: list[dict[str, float]] = []
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_resources(process, resource_samples, stop_sampling))
+
+    cpu_before = process.cpu_times()
+    wall_started_at = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + args.duration
+    guild_stats = await asyncio.gather(
+        *(
+            drive_guild(
+                guild_id=guild_id,
+                settings=settings,
+                client=client,
+                presence_manager=presence_manager,
+                source_cache=source_cache,
+                ffmpeg_governor=ffmpeg_governor,
+                download_pool=download_pool,
+                play_history=play_history,
+                deadline=deadline,
+                rnd=rnd,
+                args=args,
+            )
+            for guild_id in range(args.guilds)
+        )
+    )
+    wall_time = time.perf_counter() - wall_started_at
+    cpu_after = process.cpu_times()
+
+    stop_sampling.set()
+    await sampler
+    await play_history.close()
+    await download_pool.close()
+
+    frames = sum(stats.frames for stats in guild_stats)
+    misses = sum(stats.deadline_misses for stats in guild_stats)
+
+    return {
+        "guilds": args.guilds,
+        "duration_s": wall_time,
+        "opus_encoding": make_encoder() is not None,
+        "commands": {
+            command: percentiles([value for stats in guild_stats for value in stats.latencies[command]])
+            for command in COMMAND_WEIGHTS
+        },
+        "command_errors": sum(stats.errors for stats in guild_stats),
+        "ffmpeg_rejections": FFMPEG_REJECTIONS.get(),
+        "audio": {
+            "frames": frames,
+            "deadline_misses": misses,
+            "deadline_miss_ratio": misses / frames if frames else 0.0,
+        },
+        "process": {
+            "cpu_percent": (cpu_after.user + cpu_after.system - cpu_before.user - cpu_before.system) / wall_time * 100,
+            "children_cpu_percent": (
+                cpu_after.children_user
+                + cpu_after.children_system
+                - cpu_before.children_user
+                - cpu_before.children_system
+            )
+            / wall_time
+            * 100,
+            "max_rss_mb": max((i["rss_mb"] for i in resource_samples), default=0.0),
+            "max_children_rss_mb": max((i["children_rss_mb"] for i in resource_samples), default=0.0),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test MusicService with simulated guilds")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--think-time", type=float, default=3, help="mean pause between commands of a guild")
+    parser.add_argument("--provider-latency-min", type=float, default=0.05)
+    parser.add_argument("--provider-latency-max", type=float, default=0.5)
+    parser.add_argument("--max-ffmpeg", type=int, default=MAX_PROCESSES, help="ffmpeg processes of all guilds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        parser.error("ffmpeg is required, playback goes through the real Player")
+
+    cwd = Path.cwd()
+    output = args.output.resolve() if args.output else None
+
+    # Settings and the cache live in a temporary directory, so config.ini of the bot is never touched
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    text = json.dumps(report, indent=2)
+    print(text)  # noqa: T201
+
+    if output is not None:
+        output.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
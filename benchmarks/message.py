@@ -0,0 +1,85 @@
+import itertools
+from collections.abc import Callable, Iterator
+from functools import partial
+from types import SimpleNamespace
+
+from discord import Embed
+
+from benchmarks.common import Result, measure
+from benchmarks.queue import make_tracks
+from config.settings import Settings
+from core.models import TrackInfo
+from services.download_pool import DownloadPool
+from services.ffmpeg_governor import FFmpegGovernor
+from services.message import MessageService
+from services.music import MusicService
+from services.player import Player
+from services.queue import QueueManager
+
+SIZES = (10, 1_000, 100_000)
+
+
+def make_music_service(size: int, settings: Settings) -> tuple[MusicService, MessageService, QueueManager]:
+    voice_client = SimpleNamespace(_player=None)
+    queue_manager = QueueManager()
+    queue_manager.add_many(make_tracks(size))
+    queue_manager.get_next()
+    message_service = MessageService()
+    music_service = MusicService(
+        voice_client=voice_client,  # type: ignore[arg-type]
+        queue_manager=queue_manager,
+        player=Player(
+            voice_client=voice_client,  # type: ignore[arg-type]
+            settings=settings,
+            ffmpeg_governor=FFmpegGovernor(),
+            download_pool=DownloadPool(),
+        ),
+        download_service=None,  # type: ignore[arg-type]
+        message_service=message_service,
+        presence_manager=None,  # type: ignore[arg-type]
+        play_history=None,  # type: ignore[arg-type]
+        settings=settings,
+    )
+
+    return music_service, message_service, queue_manager
+
+
+def build_embed(
+    message_service: MessageService,
+    queue_manager: QueueManager,
+    get_track_infos: Callable[[], list[TrackInfo]],
+    refresh_track_info: Callable[[TrackInfo], None],
+    versions: Iterator[int] | None,
+) -> Embed:
+    # A new version on every call means a cache miss
+    version = next(versions) if versions is not None else queue_manager.get_version()
+
+    return message_service.get_show_queue_embed(
+        version,
+        queue_manager.get_queue_length(),
+        get_track_infos,
+        refresh_track_info,
+    )
+
+
+def run() -> dict[str, Result]:
+    settings = Settings()
+    results = {}
+
+    for size in SIZES:
+        music_service, message_service, queue_manager = make_music_service(size, settings)
+        get_track_infos = music_service._get_track_infos_for_show_queue  # noqa: SLF001
+        refresh_track_info = music_service._refresh_track_info  # noqa: SLF001
+        versions = itertools.count()
+
+        results[f"track_infos_{size}"] = measure(get_track_infos, number=1_000)
+        results[f"embed_build_{size}"] = measure(
+            partial(build_embed, message_service, queue_manager, get_track_infos, refresh_track_info, versions),
+            number=1_000,
+        )
+        results[f"embed_cached_{size}"] = measure(
+            partial(build_embed, message_service, queue_manager, get_track_infos, refresh_track_info, None),
+            number=1_000,
+        )
+
+    return results
@@ -0,0 +1,145 @@
+"""Pre-caching next to a guild's playlist: the reserved download worker stays free for the tracks to be played.
+
+A guild queues a playlist, the pre-cacher downloads the most played tracks and meanwhile a track is requested
+to be played now. Downloads go through the real DownloadPool, YouTubeDownloader and PreCacher, only yt-dlp is
+replaced by a client which takes --download-latency seconds per video. Pre-cache downloads which start while
+the background workers are busy have taken the reserved worker, there should be none of them.
+
+Usage: `python -m benchmarks.precache`
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from benchmarks.load import StubProvider
+from core.models import Track
+from services.download import DownloadService
+from services.download_pool import RESERVED_WORKERS, DownloadPool, download_session
+from services.music_downloaders.youtube import YouTubeDownloader
+from services.play_history import PlayHistory
+from services.precacher import PreCacher
+from services.source_cache import SourceCache
+
+WORKERS = 2
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=benchmark"
+GUILD_ID = 1
+PLAY_GUILD_ID = 2
+
+
+def get_video_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class FakeYoutubeClient:
+    """Extracts any source without network and downloads a video by sleeping and writing an empty file."""
+
+    def __init__(self, cache_dir: Path, playlist_size: int, download_latency: float) -> None:
+        self._cache_dir = cache_dir
+        self._playlist_size = playlist_size
+        self._download_latency = download_latency
+        self._lock = threading.Lock()
+        self._running: set[str] = set()
+        self.started: list[tuple[str, float, set[str]]] = []
+
+    def extract_info(self, source: str, *, download: bool = False, process: bool = True) -> dict:  # noqa: ARG002
+        if source == PLAYLIST_URL:
+            return {
+                "extractor": "youtube:tab",
+                "entries": iter(self._get_video_info(f"playlist-{i}") for i in range(self._playlist_size)),
+            }
+
+        return {"extractor": "youtube", **self._get_video_info(source.rsplit("=", 1)[-1])}
+
+    def download(self, url: str) -> None:
+        video_id = url.rsplit("=", 1)[-1]
+
+        with self._lock:
+            self.started.append((video_id, time.monotonic(), set(self._running)))
+            self._running.add(video_id)
+
+        time.sleep(self._download_latency)
+        Path(self._cache_dir, f"{video_id}{YouTubeDownloader.FILE_EXTENSION}").touch()
+
+        with self._lock:
+            self._running.discard(video_id)
+
+    @staticmethod
+    def _get_video_info(video_id: str) -> dict:
+        return {"id": video_id, "title": video_id, "webpage_url": get_video_url(video_id), "duration": 60}
+
+
+async def run(args: argparse.Namespace, cache_dir: Path) -> dict[str, Any]:
+    client = FakeYoutubeClient(cache_dir, args.playlist, args.download_latency)
+    download_pool = DownloadPool(workers=WORKERS)
+    yt_downloader = YouTubeDownloader(cache_dir, download_pool)
+    yt_downloader._client = client  # type: ignore[assignment]  # noqa: SLF001
+    provider = StubProvider(random.Random(0), (0.0, 0.0))  # noqa: S311
+    download_service = DownloadService(
+        yt_downloader=yt_downloader,
+        ym_downloader=provider,  # type: ignore[arg-type]
+        spotify_loader=provider,  # type: ignore[arg-type]
+        source_cache=SourceCache(cache_dir=cache_dir),
+    )
+    play_history = PlayHistory(cache_dir=cache_dir)
+
+    for i in range(args.tracks):
+        video_id = f"precache-{i}"
+        track = Track(id=video_id, title=video_id, link=get_video_url(video_id), duration=60, uuid=uuid.uuid4())
+        await play_history.record(GUILD_ID, track)
+
+    precacher = PreCacher(play_history, download_service, cache_dir, max_bandwidth=2**40)
+
+    with download_session(str(GUILD_ID)):
+        playlist = await download_service.download(PLAYLIST_URL)
+
+    precache_task = asyncio.create_task(precacher.precache(lambda: True))
+    await asyncio.sleep(args.download_latency * 1.5)
+
+    requested_at = time.monotonic()
+    with download_session(str(PLAY_GUILD_ID)):
+        await download_service.download(get_video_url("play"), only_one=True, force_load_first=True)
+
+    await precache_task
+    await asyncio.gather(*(i.download_task for i in playlist if i.download_task is not None))
+    await download_pool.close()
+    await play_history.close()
+
+    background_workers = WORKERS - RESERVED_WORKERS
+    play_started_at = next(started_at for video_id, started_at, _ in client.started if video_id == "play")
+
+    return {
+        "workers": WORKERS,
+        "reserved_workers": RESERVED_WORKERS,
+        "precached": sum(video_id.startswith("precache-") for video_id, _, _ in client.started),
+        "precache_on_reserved_worker": sum(
+            video_id.startswith("precache-")
+            and sum(i.startswith(("playlist-", "precache-")) for i in running) >= background_workers
+            for video_id, _, running in client.started
+        ),
+        "play_wait_s": round(play_started_at - requested_at, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that pre-caching never takes the reserved download worker")
+    parser.add_argument("--playlist", type=int, default=8, help="videos in the guild's playlist")
+    parser.add_argument("--tracks", type=int, default=4, help="most played tracks to pre-cache")
+    parser.add_argument("--download-latency", type=float, default=0.2, help="seconds to download a video")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = asyncio.run(run(args, Path(directory)))
+
+    print(json.dumps(report, indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
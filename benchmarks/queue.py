@@ -0,0 +1,51 @@
+import random
+import uuid
+from functools import partial
+
+from benchmarks.common import Result, measure
+from core.models import Track
+from services.queue import QueueManager
+
+SIZES = (10, 1_000, 10_000, 100_000)
+
+
+def make_tracks(count: int) -> list[Track]:
+    return [
+        Track(id=str(i), title=f"Track {i}", link=f"https://youtu.be/{i}", duration=180, uuid=uuid.uuid4())
+        for i in range(count)
+    ]
+
+
+def make_queue(tracks: list[Track]) -> QueueManager:
+    queue_manager = QueueManager()
+    queue_manager.add_many(tracks)
+    queue_manager.get_next()
+
+    return queue_manager
+
+
+def remove_first(tracks: list[Track]) -> None:
+    make_queue(tracks).remove_at(0)
+
+
+def run() -> dict[str, Result]:
+    random.seed(0)
+    results = {}
+
+    for size in SIZES:
+        tracks = make_tracks(size)
+        results[f"track_creation_{size}"] = measure(partial(make_tracks, size), repeat=3)
+        results[f"add_many_{size}"] = measure(partial(make_queue, tracks))
+
+        queue_manager = make_queue(tracks)
+        results[f"get_next_{size}"] = measure(queue_manager.get_next, number=1_000)
+        results[f"get_prev_{size}"] = measure(queue_manager.get_prev, number=1_000)
+        results[f"jump_to_{size}"] = measure(partial(queue_manager.jump_to, size // 2), number=1_000)
+        results[f"get_many_{size}"] = measure(
+            partial(queue_manager.get_many, limit=9, offset=size // 2),
+            number=1_000,
+        )
+        results[f"remove_at_{size}"] = measure(partial(remove_first, tracks), repeat=3)
+        results[f"shuffle_{size}"] = measure(queue_manager.shuffle, repeat=3)
+
+    return results
@@ -0,0 +1,33 @@
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import Result, measure
+from config.settings import Settings
+
+SIZES = (10, 1_000)
+
+
+def write_config(directory: Path, size: int) -> None:
+    lines = ["[music]", "bass = 5", "volume = 40", "", "[channels]", "general = 1", "", "[tokens]", "discord = token"]
+    lines += ["", "[user_settings]", *(f"{i} = Hello {i}::image{i}.png" for i in range(size))]
+    lines += ["", "[auto_replies]", *(f"phrase number {i} = reply {i}::image{i}.png" for i in range(size))]
+    lines += ["", "[images]", *(f"image{i} = image{i}.png" for i in range(size))]
+    directory.joinpath("config.ini").write_text("\n".join(lines), encoding="utf-8")
+
+
+def run() -> dict[str, Result]:
+    results = {}
+    cwd = Path.cwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in SIZES:
+                write_config(Path(directory), size)
+                settings = Settings()
+                results[f"load_config_{size}"] = measure(settings.load_config, number=20)
+        finally:
+            os.chdir(cwd)
+
+    return results
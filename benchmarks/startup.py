@@ -0,0 +1,153 @@
+"""Cold start: import time of main.py and time until on_ready against a stub gateway.
+
+Every round runs in a fresh interpreter, so nothing is imported in advance. Login and the gateway connection
+are replaced by stubs which dispatch ready right away, everything else (cogs, setup_hook, on_ready listeners)
+is the real code.
+
+Usage: `python -m benchmarks.startup`
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+REPEAT = 5
+TOP_MODULES = 10
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_import_times(stderr: str) -> dict[str, int]:
+    """Cumulative import time in microseconds of modules imported by main.py directly."""
+    children: dict[str, int] = {}
+
+    # Modules are reported after everything they import, two spaces of indentation per nesting level
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children[name.strip()] = int(cumulative)
+        elif level == 0:
+            if name.strip() == "main":
+                return {**children, "main": int(cumulative)}
+            children = {}
+
+    return children
+
+
+def run_child(*args: str) -> tuple[float, subprocess.CompletedProcess[str]]:
+    with tempfile.TemporaryDirectory() as directory:
+        started_at = time.perf_counter()
+        process = subprocess.run(  # noqa: S603
+            [sys.executable, *args],
+            cwd=directory,
+            env={**os.environ, "PYTHONPATH": str(ROOT_DIR), "LOG_LEVEL": "WARNING"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        return time.perf_counter() - started_at, process
+
+
+def to_result(timings: list[float]) -> dict[str, float]:
+    return {"min_ms": min(timings) * 1000, "median_ms": statistics.median(timings) * 1000}
+
+
+def run() -> dict[str, Any]:
+    import_times = []
+    module_times: dict[str, list[int]] = {}
+    process_times = []
+    ready_times: dict[str, list[float]] = {}
+
+    for _ in range(REPEAT):
+        _, process = run_child("-X", "importtime", "-c", "import main")
+        for name, cumulative in parse_import_times(process.stderr).items():
+            module_times.setdefault(name, []).append(cumulative)
+        import_times.append(module_times["main"][-1] / 1_000_000)
+
+        process_time, process = run_child("-m", "benchmarks.startup", "--child")
+        process_times.append(process_time)
+        for name, value in json.loads(process.stdout.splitlines()[-1]).items():
+            ready_times.setdefault(name, []).append(value)
+
+    modules = sorted(
+        ((name, statistics.median(times) / 1000) for name, times in module_times.items() if name != "main"),
+        key=lambda i: i[1],
+        reverse=True,
+    )
+
+    return {
+        "import_main": to_result(import_times),
+        "slowest_imports_ms": dict(modules[:TOP_MODULES]),
+        # Time from the interpreter start to on_ready, with interpreter startup and shutdown included
+        "process_to_ready": to_result(process_times),
+        **{name: to_result(times) for name, times in ready_times.items()},
+    }
+
+
+def run_stub_bot() -> None:
+    """Starts the bot with stubbed login and gateway and prints the startup phases as JSON."""
+    started_at = time.perf_counter()
+
+    from discord import ApplicationFlags  # noqa: PLC0415
+
+    from config.settings import Settings  # noqa: PLC0415
+    from main import create_bot  # noqa: PLC0415
+
+    imported_at = time.perf_counter()
+    settings = Settings()
+    bot = create_bot(settings)
+    timings: dict[str, float] = {"main_imported": imported_at - started_at}
+    closed = asyncio.Event()
+
+    async def static_login(_: str) -> dict[str, Any]:
+        return {"id": "1", "username": "bench", "discriminator": "0", "avatar": None}
+
+    async def application_info() -> SimpleNamespace:
+        return SimpleNamespace(id=1, interactions_endpoint_url=None, flags=ApplicationFlags())
+
+    async def change_presence(**_: object) -> None:
+        pass
+
+    async def connect(**_: object) -> None:
+        timings["logged_in"] = time.perf_counter() - started_at
+        bot._handle_ready()  # noqa: SLF001
+        bot.dispatch("ready")
+
+        await closed.wait()
+
+    async def on_ready() -> None:
+        timings["ready"] = time.perf_counter() - started_at
+        await bot.close()
+        closed.set()
+
+    bot.http.static_login = static_login  # type: ignore[method-assign, assignment]
+    bot.application_info = application_info  # type: ignore[method-assign, assignment]
+    bot.change_presence = change_presence  # type: ignore[method-assign]
+    bot.connect = connect  # type: ignore[method-assign]
+    bot.add_listener(on_ready)
+
+    asyncio.run(bot.start("token"))
+
+    print(json.dumps(timings))  # noqa: T201
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        run_stub_bot()
+    else:
+        print(json.dumps(run(), indent=2))  # noqa: T201
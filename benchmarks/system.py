@@ -0,0 +1,59 @@
+import os
+import random
+import tempfile
+from collections.abc import Iterator
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.auto_replies import MESSAGE_COUNT, SEED, make_messages, make_rules
+from benchmarks.common import Result, measure_async
+from bot.cogs.system import SystemCog
+from bot.factory import ServiceFactory
+from config.settings import Settings
+
+RULE_COUNTS = (10, 1_000)
+
+
+class StubChannel:
+    async def send(self, **_: object) -> SimpleNamespace:
+        return SimpleNamespace(id=0, attachments=[])
+
+
+async def on_next_message(system_cog: SystemCog, messages: Iterator[SimpleNamespace]) -> None:
+    await system_cog.on_message(next(messages))  # type: ignore[arg-type]
+
+
+def run() -> dict[str, Result]:
+    rnd = random.Random(SEED)  # noqa: S311
+    results = {}
+    cwd = Path.cwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        Path("images").mkdir()
+        Path("images", "image.png").write_bytes(b"image")
+
+        try:
+            for count in RULE_COUNTS:
+                settings = Settings()
+                settings.auto_replies = make_rules(rnd, count)
+                bot = SimpleNamespace(user=object())
+                system_cog = SystemCog(bot=bot, settings=settings, service_factory=ServiceFactory(settings))  # type: ignore[arg-type]
+                channel = StubChannel()
+                messages = iter(
+                    [
+                        SimpleNamespace(author=None, mention_everyone=False, content=content, channel=channel)
+                        for content in make_messages(rnd, settings.auto_replies)
+                    ]
+                    * 5
+                )
+
+                results[f"on_message_{count}_rules"] = measure_async(
+                    partial(on_next_message, system_cog, messages),
+                    number=MESSAGE_COUNT,
+                )
+        finally:
+            os.chdir(cwd)
+
+    return results
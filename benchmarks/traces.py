@@ -0,0 +1,59 @@
+"""Per-stage latency breakdown of commands from spans exported by core.tracing.
+
+Spans of a request are grouped under its root command span, every stage shows how many times it ran and its
+latency percentiles.
+
+Usage: `python -m benchmarks.traces traces.jsonl`
+"""
+
+import argparse
+import json
+import statistics
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+
+def load_spans(file_path: Path) -> list[dict[str, Any]]:
+    with file_path.open(encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {"count": len(values), "p50_ms": values[0] * 1000 if values else 0.0}
+
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+
+    return {
+        "count": len(values),
+        "p50_ms": quantiles[49] * 1000,
+        "p90_ms": quantiles[89] * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def breakdown(spans: list[dict[str, Any]]) -> dict[str, dict[str, dict[str, float]]]:
+    commands = {i["request_id"]: i["name"] for i in spans if i["parent_id"] is None}
+    durations: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+
+    for span in spans:
+        if (command := commands.get(span["request_id"])) is not None and span["duration"] is not None:
+            durations[command][span["name"]].append(span["duration"])
+
+    return {
+        command: {name: percentiles(values) for name, values in sorted(stages.items())}
+        for command, stages in sorted(durations.items())
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize exported spans by command and stage")
+    parser.add_argument("file", type=Path)
+    args = parser.parse_args()
+
+    print(json.dumps(breakdown(load_spans(args.file)), indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Voice drop recovery: how long playback is silent after a voice connection is lost and where it resumes.
+
+Every track is restarted once more with a new volume after the drop. Neither the resume nor the restart is a new
+play, so the play history should count exactly one play per drop.
+
+The voice client of the load harness is dropped in the middle of a track the way discord.py gives up a
+connection, the player is stopped and the client isn't connected anymore. Connecting again takes
+--connect-latency seconds. Playback goes through the real Player, so ffmpeg must be installed.
+
+Usage: `python -m benchmarks.voice_drop --drops 5`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from benchmarks.load import (
+    FakeChannel,
+    FakeClient,
+    FakeContext,
+    FakeVoiceClient,
+    GuildStats,
+    StubProvider,
+    percentiles,
+    prepare_cache,
+)
+from config.settings import Settings
+from services.download import DownloadService
+from services.download_pool import DownloadPool
+from services.ffmpeg_governor import FFmpegGovernor
+from services.message import MessageService
+from services.music import MusicService
+from services.play_history import PlayHistory
+from services.player import Player
+from services.presence import PresenceManager
+from services.queue import QueueManager
+from services.source_cache import SourceCache
+
+GUILD_ID = 1
+RESUME_TIMEOUT = 30.0
+POLL_INTERVAL = 0.005
+
+
+class FakeVoiceChannel:
+    def __init__(self, client: FakeClient, stats: GuildStats, connect_latency: float) -> None:
+        self._client = client
+        self._stats = stats
+        self._connect_latency = connect_latency
+        self.voice_client: DroppingVoiceClient | None = None
+
+    async def connect(self, **_: Any) -> "DroppingVoiceClient":  # noqa: ANN401
+        await asyncio.sleep(self._connect_latency)
+        self.voice_client = DroppingVoiceClient(self, self._client, self._stats)
+
+        return self.voice_client
+
+
+class DroppingVoiceClient(FakeVoiceClient):
+    def __init__(self, channel: FakeVoiceChannel, client: FakeClient, stats: GuildStats) -> None:
+        super().__init__(GUILD_ID, client, asyncio.get_running_loop(), stats)
+        self.channel = channel
+        self._connected = True
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def drop(self) -> None:
+        self._connected = False
+        self.stop()
+
+    async def disconnect(self, *, force: bool = False) -> None:  # noqa: ARG002
+        self._connected = False
+        self.stop()
+
+    def cleanup(self) -> None:
+        pass
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    rnd = random.Random(args.seed)  # noqa: S311
+    settings = Settings()
+    settings.cached_music_dir = Path.cwd()
+    prepare_cache(settings.cached_music_dir)
+
+    client = FakeClient()
+    stats = GuildStats()
+    channel = FakeVoiceChannel(client, stats, args.connect_latency)
+    voice_client = await channel.connect()
+    provider = StubProvider(rnd, (0.0, 0.0))
+    queue_manager = QueueManager()
+    player = Player(
+        voice_client=voice_client,  # type: ignore[arg-type]
+        settings=settings,
+        ffmpeg_governor=FFmpegGovernor(),
+        download_pool=DownloadPool(),
+    )
+    play_history = PlayHistory(cache_dir=settings.cached_music_dir)
+    music_service = MusicService(
+        voice_client=voice_client,  # type: ignore[arg-type]
+        queue_manager=queue_manager,
+        player=player,
+        download_service=DownloadService(
+            yt_downloader=provider,  # type: ignore[arg-type]
+            ym_downloader=provider,  # type: ignore[arg-type]
+            spotify_loader=provider,  # type: ignore[arg-type]
+            source_cache=SourceCache(cache_dir=settings.cached_music_dir),
+        ),
+        message_service=MessageService(),
+        presence_manager=PresenceManager(client),  # type: ignore[arg-type]
+        play_history=play_history,
+        settings=settings,
+    )
+    ctx = FakeContext(FakeChannel(GUILD_ID))
+    loop = asyncio.get_running_loop()
+    gaps: list[float] = []
+    position_errors: list[float] = []
+    failures = 0
+
+    for i in range(args.drops):
+        await music_service.play(source=f"track {i}", ctx=ctx, start_time=None)  # type: ignore[arg-type]
+        await asyncio.sleep(rnd.uniform(1, 3))
+
+        track = queue_manager.get_current()
+        if track is None or channel.voice_client is None:
+            failures += 1
+            continue
+
+        position = player.get_position(track)
+        frames = stats.frames
+        dropped_at = loop.time()
+        channel.voice_client.drop()
+
+        while stats.frames == frames and loop.time() - dropped_at < RESUME_TIMEOUT:  # noqa: ASYNC110
+            await asyncio.sleep(POLL_INTERVAL)
+
+        if stats.frames == frames:
+            failures += 1
+        else:
+            gaps.append(loop.time() - dropped_at)
+            position_errors.append(abs((track.im_start_time - position).total_seconds()))
+
+        await music_service.set_music_parameters(ctx, volume_value=rnd.randint(10, 100))  # type: ignore[arg-type]
+        await music_service.stop(ctx)  # type: ignore[arg-type]
+
+    history_plays = sum(i.play_count for i in await play_history.get_most_played(GUILD_ID, args.drops))
+    await play_history.close()
+
+    return {
+        "drops": args.drops,
+        "history_plays": history_plays,
+        "connect_latency_s": args.connect_latency,
+        "failures": failures,
+        "silence": percentiles(gaps),
+        "max_position_error_s": max(position_errors, default=0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure playback recovery after voice connection drops")
+    parser.add_argument("--drops", type=int, default=5)
+    parser.add_argument("--connect-latency", type=float, default=0.3, help="seconds to connect to voice")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        parser.error("ffmpeg is required, playback goes through the real Player")
+
+    cwd = Path.cwd()
+
+    # Settings and the cache live in a temporary directory, so config.ini of the bot is never touched
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(report, indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
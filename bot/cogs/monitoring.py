@@ -0,0 +1,163 @@
+import asyncio
+from pathlib import Path
+
+from discord.ext import commands
+
+from bot.factory import ServiceFactory
+from config.settings import Settings
+from core.metrics import (
+    ACTIVE_DOWNLOADS,
+    ACTIVE_FFMPEG_PROCESSES,
+    CACHE_BYTES,
+    COMMAND_LATENCY,
+    FFMPEG_CPU_SECONDS,
+    FFMPEG_RSS_BYTES,
+    OUTBOX_DEPTH,
+    OUTBOX_MAX_DELAY,
+    QUEUED_DOWNLOADS,
+    MetricsServer,
+    registry,
+)
+from core.tracing import Span, finish_span, start_span
+from core.watchdog import LoopWatchdog, current_command
+
+
+class MonitoringCog(commands.Cog):
+    """Serves runtime metrics on a local HTTP endpoint when metrics port is configured
+    and runs the event loop watchdog when it's enabled.
+    """
+
+    def __init__(self, bot: commands.Bot, settings: Settings, service_factory: ServiceFactory) -> None:
+        self._bot = bot
+        self._settings = settings
+        self._message_service = service_factory.create_message_service()
+        self._ffmpeg_governor = service_factory.create_ffmpeg_governor()
+        self._download_pool = service_factory.create_download_pool()
+        self._metrics_server: MetricsServer | None = None
+        self._watchdog: LoopWatchdog | None = None
+        self._command_started_at: dict[int, float] = {}
+        self._request_spans: dict[int, Span | None] = {}
+
+    async def cog_load(self) -> None:
+        self._bot.before_invoke(self._before_invoke)
+        self._bot.after_invoke(self._after_invoke)
+        self._settings.add_reload_listener(self._restart_watchdog)
+        self._restart_watchdog()
+
+        if self._settings.metrics_port is None:
+            return
+
+        # The filesystem and psutil are read in a thread, the rest on the loop, which changes what they read
+        CACHE_BYTES.add_collector(self._collect_cache_bytes, blocking=True)
+        ACTIVE_FFMPEG_PROCESSES.add_collector(self._collect_ffmpeg_processes, blocking=True)
+        FFMPEG_CPU_SECONDS.add_collector(self._collect_ffmpeg_cpu_seconds, blocking=True)
+        FFMPEG_RSS_BYTES.add_collector(self._collect_ffmpeg_rss_bytes, blocking=True)
+        OUTBOX_DEPTH.add_collector(self._collect_outbox_depth)
+        OUTBOX_MAX_DELAY.add_collector(self._collect_outbox_max_delay)
+        ACTIVE_DOWNLOADS.add_collector(self._collect_active_downloads)
+        QUEUED_DOWNLOADS.add_collector(self._collect_queued_downloads)
+
+        self._metrics_server = MetricsServer(registry, self._settings.metrics_host, self._settings.metrics_port)
+        await self._metrics_server.start()
+
+    async def cog_unload(self) -> None:
+        CACHE_BYTES.remove_collector(self._collect_cache_bytes)
+        ACTIVE_FFMPEG_PROCESSES.remove_collector(self._collect_ffmpeg_processes)
+        FFMPEG_CPU_SECONDS.remove_collector(self._collect_ffmpeg_cpu_seconds)
+        FFMPEG_RSS_BYTES.remove_collector(self._collect_ffmpeg_rss_bytes)
+        OUTBOX_DEPTH.remove_collector(self._collect_outbox_depth)
+        OUTBOX_MAX_DELAY.remove_collector(self._collect_outbox_max_delay)
+        ACTIVE_DOWNLOADS.remove_collector(self._collect_active_downloads)
+        QUEUED_DOWNLOADS.remove_collector(self._collect_queued_downloads)
+
+        self._settings.remove_reload_listener(self._restart_watchdog)
+
+        if self._watchdog is not None:
+            self._watchdog.stop()
+
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+
+    def _restart_watchdog(self) -> None:
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog = None
+
+        # Loop lag is measured for metrics even when blocking detection is switched off
+        if self._settings.watchdog_enabled or self._settings.metrics_port is not None:
+            self._watchdog = LoopWatchdog(
+                block_threshold=self._settings.watchdog_threshold if self._settings.watchdog_enabled else None,
+            )
+            self._watchdog.start()
+
+    async def _before_invoke(self, ctx: commands.Context) -> None:
+        # Runs inside the command task, so the watchdog can tell which command blocked the loop
+        current_command.set(ctx.command.qualified_name if ctx.command else None)
+        # Everything the command awaits is traced as a part of its request
+        self._request_spans[ctx.message.id] = start_span(
+            f"command.{ctx.command.qualified_name if ctx.command else None}",
+            guild=ctx.guild.id if ctx.guild else None,
+            author=ctx.author.id,
+        )
+
+    async def _after_invoke(self, ctx: commands.Context) -> None:
+        if span := self._request_spans.pop(ctx.message.id, None):
+            span.set(failed=ctx.command_failed)
+            finish_span(span)
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context) -> None:
+        self._command_started_at[ctx.message.id] = asyncio.get_running_loop().time()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context) -> None:
+        self._observe_command_latency(ctx)
+
+    @commands.Cog.listener()
+    async def on_command_error(self, ctx: commands.Context, _: commands.CommandError) -> None:
+        self._observe_command_latency(ctx)
+
+    def _observe_command_latency(self, ctx: commands.Context) -> None:
+        if (started_at := self._command_started_at.pop(ctx.message.id, None)) is not None and ctx.command:
+            COMMAND_LATENCY.observe(
+                ctx.command.qualified_name,
+                value=asyncio.get_running_loop().time() - started_at,
+            )
+
+    def _collect_cache_bytes(self) -> dict[tuple[str, ...], float]:
+        cache_dir = Path(self._settings.cached_music_dir)
+        if not cache_dir.exists():
+            return {(): 0}
+
+        return {(): sum(i.stat().st_size for i in cache_dir.iterdir() if i.is_file())}
+
+    def _collect_ffmpeg_processes(self) -> dict[tuple[str, ...], float]:
+        import psutil  # noqa: PLC0415
+
+        count = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                if child.name().startswith("ffmpeg"):
+                    count += 1
+            except psutil.Error:
+                continue
+
+        return {(): count}
+
+    def _collect_ffmpeg_cpu_seconds(self) -> dict[tuple[str, ...], float]:
+        return {(str(i.session), str(i.pid)): i.cpu_seconds for i in self._ffmpeg_governor.get_stats()}
+
+    def _collect_ffmpeg_rss_bytes(self) -> dict[tuple[str, ...], float]:
+        return {(str(i.session), str(i.pid)): i.rss_bytes for i in self._ffmpeg_governor.get_stats()}
+
+    def _collect_outbox_depth(self) -> dict[tuple[str, ...], float]:
+        return {(str(i),): stats.depth for i, stats in self._message_service.get_outbox_stats().items()}
+
+    def _collect_outbox_max_delay(self) -> dict[tuple[str, ...], float]:
+        return {(str(i),): stats.max_delay for i, stats in self._message_service.get_outbox_stats().items()}
+
+    def _collect_active_downloads(self) -> dict[tuple[str, ...], float]:
+        return {(): self._download_pool.get_stats().active}
+
+    def _collect_queued_downloads(self) -> dict[tuple[str, ...], float]:
+        return {(i,): count for i, count in self._download_pool.get_stats().queued.items()}
@@ -1,19 +1,26 @@
+import asyncio
 import logging
 from asyncio import wait_for
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from typing import TYPE_CHECKING
 
-from dateutil import parser
-from discord import Member, Reaction, User, VoiceClient
+from discord import Member, VoiceClient, VoiceState
 from discord.ext import commands
 
 from bot.factory import ServiceFactory
 from config.settings import Settings
 from core.logging import logger
+from core.metrics import QUEUE_LENGTH
+from core.priority import lower_thread_priority
+from core.tracing import trace
 
 if TYPE_CHECKING:
     from services.music import MusicService
 
+WARM_UP_TIMEOUT = 60
+
 
 class MusicCog(commands.Cog):
     def __init__(self, bot: commands.Bot, settings: Settings, service_factory: ServiceFactory) -> None:
@@ -22,11 +29,97 @@ class MusicCog(commands.Cog):
         self._service_factory = service_factory
         self._message_service = service_factory.create_message_service()
         self._music_service: MusicService | None = None
+        self._warm_up_task: asyncio.Task | None = None
+        self._precache_task: asyncio.Task | None = None
+
+    async def cog_load(self) -> None:
+        QUEUE_LENGTH.add_collector(self._collect_queue_lengths)
+
+    async def cog_unload(self) -> None:
+        QUEUE_LENGTH.remove_collector(self._collect_queue_lengths)
+
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+
+        if self._precache_task is not None:
+            self._precache_task.cancel()
+
+        await self._service_factory.close()
 
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction: Reaction, user: Member | User) -> None:
-        if self._bot.user is not None and user.id != self._bot.user.id and self._music_service is not None:
-            await self._music_service.on_message_reaction_add(reaction, user)
+    async def on_ready(self) -> None:
+        # on_ready is dispatched again after reconnects, but providers need to be warmed up once
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self._warm_up())
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: Member, before: VoiceState, after: VoiceState) -> None:
+        # The bot has left its channel without leave, so someone has disconnected it and recovery shouldn't rejoin
+        if (
+            self._music_service is not None
+            and self._bot.user is not None
+            and member.id == self._bot.user.id
+            and member.guild.id == self._music_service.get_guild_id()
+            and before.channel is not None
+            and after.channel is None
+        ):
+            self._music_service.on_voice_kicked()
+
+    async def _warm_up(self) -> None:
+        """Create provider clients and do their lazy initialization, so the first play is as fast as the next ones.
+
+        Blocking parts run in a low priority thread and don't slow down commands and playback.
+        """
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up", initializer=lower_thread_priority)
+
+        async def warm_up_youtube() -> None:
+            yt_downloader = await self._service_factory.load_yt_downloader(executor)
+            await loop.run_in_executor(executor, yt_downloader.warm_up, self._settings.warm_up_source)
+
+        async def warm_up_yandex_music() -> None:
+            ym_downloader = await self._service_factory.load_ym_downloader(executor)
+            await ym_downloader.warm_up()
+
+        async def load_source_cache() -> None:
+            await self._service_factory.load_source_cache(executor)
+
+        async def schedule_transcoding() -> None:
+            if (transcoder := self._service_factory.create_transcoder()) is not None:
+                await transcoder.schedule_pending()
+
+        try:
+            await asyncio.gather(
+                self._warm_up_provider("source cache", load_source_cache),
+                self._warm_up_provider("transcoder", schedule_transcoding),
+                self._warm_up_provider("youtube", warm_up_youtube),
+                self._warm_up_provider("yandex music", warm_up_yandex_music),
+                self._warm_up_provider("spotify", lambda: self._service_factory.create_spotify_loader().warm_up()),
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+        logger.info("Providers are warmed up in %.1fs", loop.time() - started_at)
+
+        if self._settings.precache_enabled:
+            precacher = await self._service_factory.create_precacher()
+            self._precache_task = asyncio.create_task(precacher.run(self._is_idle))
+
+    async def _warm_up_provider(self, name: str, warm_up: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await wait_for(warm_up(), WARM_UP_TIMEOUT)
+        except Exception:  # noqa: BLE001
+            logger.exception("Can't warm up %s", name)
+
+    def _is_idle(self) -> bool:
+        return self._music_service is None or not self._music_service.is_playing()
+
+    def _collect_queue_lengths(self) -> dict[tuple[str, ...], float]:
+        if (music_service := self._music_service) is None:
+            return {}
+
+        return {(str(music_service.get_guild_id()),): music_service.get_queue_length()}
 
     @commands.command(aliases=("нога",))
     async def restart(self, ctx: commands.Context) -> None:
@@ -38,6 +131,8 @@ class MusicCog(commands.Cog):
         except Exception:  # noqa: BLE001
             logger.exception("Restart error")
 
+        await self._message_service.flush()
+        await self._settings.flush_config()
         await self._bot.close()
 
     @commands.command(aliases=("сюда",))
@@ -55,27 +150,35 @@ class MusicCog(commands.Cog):
 
         if voice_client := self._get_guild_voice_client(ctx):
             if not voice_client.is_connected():
-                await voice_client.disconnect(force=True)
-                await voice_client.channel.connect(timeout=60, reconnect=True, self_deaf=True)
-
-            if move and not self._is_voice_client_here(ctx):
+                if self._music_service is not None:
+                    # The service is moved to a new voice client, the old one is disconnected for good
+                    await self._music_service.reconnect(ctx)
+                    voice_client = self._get_guild_voice_client(ctx)
+                else:
+                    await voice_client.disconnect(force=True)
+                    voice_client = await voice_client.channel.connect(timeout=60, reconnect=True, self_deaf=True)
+                    self._music_service = await self._service_factory.create_music_service(voice_client=voice_client)
+
+            if move and voice_client is not None and not self._is_voice_client_here(ctx):
                 await voice_client.move_to(author_voice_channel)
         else:
             voice_client = await author_voice_channel.connect()
-            self._music_service = self._service_factory.create_music_service(voice_client=voice_client)
+            self._music_service = await self._service_factory.create_music_service(voice_client=voice_client)
 
         await self._message_service.send(ctx, "Ннннну давай!")
 
     @commands.command(aliases=("сьеби", "съеби", "уходи", "l"))
     async def leave(self, ctx: commands.Context) -> None:
         """Try to drop the bot from guild voice channels."""
-        logger.info("%s started leaving.", str(ctx.author))
+        logger.info("%s started leaving.", ctx.author)
 
         if self._music_service:
             await self._music_service.stop(ctx)
 
         if (voice_client := self._get_guild_voice_client(ctx)) is not None:
             await voice_client.disconnect()
+            self._service_factory.create_ffmpeg_governor().release(voice_client.guild.id)
+            self._service_factory.create_download_pool().cancel(str(voice_client.guild.id))
 
         await self._message_service.send(ctx, "На созвоне)")
         self._music_service = None
@@ -318,7 +421,8 @@ class MusicCog(commands.Cog):
 
         if not voice_client or not voice_client.is_connected():
             try:
-                await wait_for(self.summon(ctx, move=False), 10)
+                with trace("music_cog.summon"):
+                    await wait_for(self.summon(ctx, move=False), 10)
             except Exception:  # noqa: BLE001
                 await self._message_service.send(ctx, "Bot summon timeout error.", logging.ERROR)
                 return
@@ -363,6 +467,8 @@ class MusicCog(commands.Cog):
         start_time = timedelta()
         strings = list(args)
         if len(args) > 1:
+            from dateutil import parser  # noqa: PLC0415
+
             try:
                 parsed_time = parser.parse(strings[-1])
                 start_time = timedelta(seconds=parsed_time.second, hours=parsed_time.hour, minutes=parsed_time.minute)
@@ -1,13 +1,31 @@
+import asyncio
+import io
 from datetime import datetime
 from pathlib import Path
 
-import psutil
-from discord import Activity, ActivityType, File, Guild, Member, Message, Status, TextChannel, User, VoiceState
+from discord import (
+    Activity,
+    ActivityType,
+    File,
+    Guild,
+    Member,
+    Message,
+    RawMessageDeleteEvent,
+    TextChannel,
+    User,
+    VoiceState,
+)
 from discord.ext import commands
 
 from bot.factory import ServiceFactory
 from config.settings import Settings
+from core import profiling
 from core.logging import logger
+from services.auto_reply import AutoReplyMatcher
+
+BAN_IMAGE_NAME = "ban.jpg"
+PROFILE_SECONDS = 10
+MAX_PROFILE_SECONDS = 120
 
 
 class SystemCog(commands.Cog):
@@ -15,26 +33,100 @@ class SystemCog(commands.Cog):
         self._bot = bot
         self._settings = settings
         self._message_service = service_factory.create_message_service()
+        self._presence_manager = service_factory.create_presence_manager(bot)
+        self._config_watch_task: asyncio.Task | None = None
+        self._auto_reply_matcher = AutoReplyMatcher(settings.auto_replies)
+        self._attachment_cache = service_factory.create_attachment_cache()
+        self._preload_images_task: asyncio.Task | None = None
+        self._profile_lock = asyncio.Lock()
         now = datetime.now()  # noqa: DTZ005
         local_now = now.astimezone()
         self._local_tz = local_now.tzinfo
 
+    async def cog_load(self) -> None:
+        self._settings.add_reload_listener(self._on_config_reload)
+        self._config_watch_task = asyncio.create_task(self._settings.watch_config())
+        self._preload_images()
+
+    async def cog_unload(self) -> None:
+        self._settings.remove_reload_listener(self._on_config_reload)
+
+        if self._config_watch_task is not None:
+            self._config_watch_task.cancel()
+
+    def _on_config_reload(self) -> None:
+        self._auto_reply_matcher = AutoReplyMatcher(self._settings.auto_replies)
+        self._attachment_cache.clear()
+        self._preload_images()
+
+    def _preload_images(self) -> None:
+        image_names = {
+            BAN_IMAGE_NAME,
+            *(str(image_path) for image_path in self._settings.images.values()),
+            *(user_setting.gratings_image_name for user_setting in self._settings.users_settings.values()),
+            *(auto_reply.image_name for auto_reply in self._settings.auto_replies.values()),
+        }
+        self._preload_images_task = asyncio.create_task(self._attachment_cache.preload(image_names))
+
     @commands.command()
     async def free_cache(self, ctx: commands.Context) -> None:
         """removes cached tracks."""
-        for filename in Path(self._settings.cached_music_dir).iterdir():
-            filename.unlink()
-
+        await asyncio.to_thread(self._remove_cached_tracks)
         await self._message_service.send(ctx, "Cached tracks are removed")
 
+    def _remove_cached_tracks(self) -> None:
+        # Dot files are the bot's own state, the play history database and the source cache, which are in use
+        for path in Path(self._settings.cached_music_dir).iterdir():
+            if path.is_file() and not path.name.startswith("."):
+                path.unlink()
+
+    @commands.command()
+    async def reload_config(self, ctx: commands.Context) -> None:
+        """Reloads config.ini without reconnecting."""
+        await self._settings.reload_config()
+        await self._message_service.send(ctx, "Config is reloaded")
+
     @commands.command()
     async def sys_info(self, ctx: commands.Context) -> None:
         """Shows system information."""
+        import psutil  # noqa: PLC0415
+
         free_space = int(psutil.disk_usage("/").free / 1024 / 1024)
         free_memory = int(psutil.virtual_memory().free / 1024 / 1024)
 
         await self._message_service.send(ctx, f"Free space - {free_space}mb\nFree memory - {free_memory}mb")
 
+    @commands.command()
+    @commands.is_owner()
+    async def profile(self, ctx: commands.Context, seconds: int = PROFILE_SECONDS) -> None:
+        """Samples all threads and sends CPU and wall clock flame graph stacks with top memory allocations."""
+        if self._profile_lock.locked():
+            await self._message_service.send(ctx, "Profiling is already running")
+
+            return
+
+        seconds = min(max(seconds, 1), MAX_PROFILE_SECONDS)
+
+        async with self._profile_lock:
+            await self._message_service.send(ctx, f"Profiling for {seconds}s")
+            result = await asyncio.to_thread(profiling.profile, seconds)
+
+        await self._message_service.send_files(
+            ctx,
+            content=f"{result.samples} samples of {len(result.thread_names)} threads in {seconds}s",
+            files=[
+                File(
+                    io.BytesIO(profiling.ProfileResult.to_folded(result.cpu_stacks).encode()),
+                    filename="profile-cpu.folded",
+                ),
+                File(
+                    io.BytesIO(profiling.ProfileResult.to_folded(result.wall_stacks).encode()),
+                    filename="profile-wall.folded",
+                ),
+                File(io.BytesIO("\n".join(result.allocations).encode()), filename="allocations.txt"),
+            ],
+        )
+
     @commands.command(aliases=("здарова",))
     async def hello(self, ctx: commands.Context) -> None:
         """Sends hello message."""
@@ -48,7 +140,12 @@ class SystemCog(commands.Cog):
             channel = self._bot.get_channel(channel_id)
 
             if isinstance(channel, TextChannel):
-                await channel.send(content=f"{user.name}, бан, чучело", tts=True, file=File("images/ban.jpg"))
+                await self._attachment_cache.send(
+                    channel,
+                    BAN_IMAGE_NAME,
+                    content=f"{user.name}, бан, чучело",
+                    tts=True,
+                )
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: Member | User, before: VoiceState, _: VoiceState) -> None:
@@ -78,16 +175,17 @@ class SystemCog(commands.Cog):
             if user_setting := self._settings.users_settings.get(member.id):
                 if channel_id := self._settings.channels.get("general"):
                     channel = self._bot.get_channel(channel_id)
-                    logger.info("Send grating message to %s", str(member))
+                    logger.info("Send grating message to %s", member)
 
                     if isinstance(channel, TextChannel):
-                        await channel.send(
+                        await self._attachment_cache.send(
+                            channel,
+                            user_setting.gratings_image_name,
                             content=user_setting.gratings_text,
-                            file=File(Path("images").joinpath(user_setting.gratings_image_name)),
                             delete_after=10,
                         )
             else:
-                logger.info("Member %s is here.", str(member))
+                logger.info("Member %s is here.", member)
 
     @commands.Cog.listener()
     async def on_message(self, message: Message) -> None:
@@ -95,26 +193,23 @@ class SystemCog(commands.Cog):
             return
 
         if message.mention_everyone:
-            await message.channel.send(
+            await self._attachment_cache.send(
+                message.channel,
+                str(self._settings.images["vse_suda"]),
                 content="Все сюдаааааааааааааа!",
                 tts=True,
-                file=File(Path("images").joinpath(self._settings.images["vse_suda"])),
                 delete_after=1006,
             )
 
-        for text, auto_reply in self._settings.auto_replies.items():
-            if text.lower().strip() in message.content.lower().strip():
-                await message.channel.send(
-                    content=auto_reply.text,
-                    file=File(Path("images").joinpath(auto_reply.image_name)),
-                )
-                break
+        if auto_reply := self._auto_reply_matcher.match(message.content):
+            await self._attachment_cache.send(message.channel, auto_reply.image_name, content=auto_reply.text)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent) -> None:
+        self._attachment_cache.forget_message(payload.message_id)
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
-        logger.info("We have logged in as %s", str(self._bot.user))
+        logger.info("We have logged in as %s", self._bot.user)
 
-        await self._bot.change_presence(
-            status=Status.online,
-            activity=Activity(name="кочалке", type=ActivityType.competing),
-        )
+        self._presence_manager.update(Activity(name="кочалке", type=ActivityType.competing))
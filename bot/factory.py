@@ -1,45 +1,61 @@
-from discord import VoiceClient
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from discord import Client, VoiceClient
 
 from config.settings import Settings
+from services.attachments import AttachmentCache
 from services.download import DownloadService
+from services.download_pool import DownloadPool
+from services.ffmpeg_governor import FFmpegGovernor
 from services.message import MessageService
 from services.music import MusicService
-from services.music_downloaders.yandex import YandexMusicDownloader
-from services.music_downloaders.youtube import YouTubeDownloader
-from services.music_info_loaders.spotify import SpotifyInfoLoader
+from services.play_history import PlayHistory
 from services.player import Player
+from services.precacher import PreCacher
+from services.presence import PresenceManager
 from services.queue import QueueManager
+from services.source_cache import SourceCache
+from services.transcoder import Transcoder
+
+if TYPE_CHECKING:
+    from services.music_downloaders.yandex import YandexMusicDownloader
+    from services.music_downloaders.youtube import YouTubeDownloader
+    from services.music_info_loaders.spotify import SpotifyInfoLoader
+
+T = TypeVar("T")
 
 
 class ServiceFactory:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
         self._message_service: MessageService | None = None
+        self._presence_manager: PresenceManager | None = None
+        self._attachment_cache: AttachmentCache | None = None
+        self._yt_downloader: YouTubeDownloader | None = None
+        self._ym_downloader: YandexMusicDownloader | None = None
+        self._spotify_loader: SpotifyInfoLoader | None = None
+        self._source_cache: SourceCache | None = None
+        self._transcoder: Transcoder | None = None
+        self._ffmpeg_governor: FFmpegGovernor | None = None
+        self._play_history: PlayHistory | None = None
+        self._download_service: DownloadService | None = None
+        self._download_pool: DownloadPool | None = None
+        # Providers which take long to create are created in a thread once, see _load
+        self._loading: dict[str, asyncio.Future[Any]] = {}
 
-    def create_music_service(
+    async def create_music_service(
         self,
         voice_client: VoiceClient,
     ) -> MusicService:
-        ym_downloader = YandexMusicDownloader(
-            token=self.settings.tokens["yandex_music"],
-            cache_dir=self.settings.cached_music_dir,
-        )
-        yt_downloader = YouTubeDownloader(cache_dir=self.settings.cached_music_dir)
-        spotify_loader = SpotifyInfoLoader(
-            client_id=self.settings.tokens["spotify_client_id"],
-            client_secret=self.settings.tokens["spotify_client_secret"],
-        )
-
-        download_service = DownloadService(
-            yt_downloader=yt_downloader,
-            ym_downloader=ym_downloader,
-            spotify_loader=spotify_loader,
-        )
-
         queue_manager = QueueManager()
         player = Player(
             voice_client=voice_client,
             settings=self.settings,
+            ffmpeg_governor=self.create_ffmpeg_governor(),
+            download_pool=self.create_download_pool(),
         )
 
         # Create music service
@@ -47,13 +63,179 @@ class ServiceFactory:
             voice_client=voice_client,
             queue_manager=queue_manager,
             player=player,
-            download_service=download_service,
+            download_service=await self.create_download_service(),
             message_service=self.create_message_service(),
+            presence_manager=self.create_presence_manager(voice_client.client),
+            play_history=self.create_play_history(),
             settings=self.settings,
         )
 
+    async def close(self) -> None:
+        if self._message_service is not None:
+            await self._message_service.close()
+
+        if self._download_pool is not None:
+            await self._download_pool.close()
+
+        if self._yt_downloader is not None:
+            self._yt_downloader.close()
+
+        if self._transcoder is not None:
+            await self._transcoder.close()
+
+        if self._source_cache is not None:
+            await self._source_cache.flush()
+
+        if self._play_history is not None:
+            await self._play_history.close()
+
+    async def create_download_service(self) -> DownloadService:
+        if self._download_service is None:
+            yt_downloader, ym_downloader, source_cache = await asyncio.gather(
+                self.load_yt_downloader(),
+                self.load_ym_downloader(),
+                self.load_source_cache(),
+            )
+
+            # Another caller may have created it while the providers were loaded
+            if self._download_service is None:
+                self._download_service = DownloadService(
+                    yt_downloader=yt_downloader,
+                    ym_downloader=ym_downloader,
+                    spotify_loader=self.create_spotify_loader(),
+                    source_cache=source_cache,
+                )
+
+        return self._download_service
+
+    async def load_yt_downloader(self, executor: Executor | None = None) -> "YouTubeDownloader":
+        # Dependencies are created on the loop, so the thread doesn't race with it
+        self.create_download_pool()
+
+        return await self._load(self.create_yt_downloader, executor)
+
+    async def load_ym_downloader(self, executor: Executor | None = None) -> "YandexMusicDownloader":
+        self.create_download_pool()
+        self.create_transcoder()
+
+        return await self._load(self.create_ym_downloader, executor)
+
+    async def load_source_cache(self, executor: Executor | None = None) -> SourceCache:
+        return await self._load(self.create_source_cache, executor)
+
+    async def _load(self, create: Callable[[], T], executor: Executor | None) -> T:
+        """Run a slow create method in a thread once, callers on the loop wait for the same creation.
+
+        The create methods aren't thread safe, so on the loop they are called only after their object is loaded.
+        """
+        name = create.__name__
+        future = self._loading.get(name)
+
+        # A failed creation is tried again by the next caller
+        if future is None or (future.done() and (future.cancelled() or future.exception() is not None)):
+            future = self._loading[name] = asyncio.get_running_loop().run_in_executor(executor, create)
+
+        # Callers may be cancelled, the creation goes on for the others
+        return await asyncio.shield(future)
+
     def create_message_service(self) -> MessageService:
         if self._message_service is None:
             self._message_service = MessageService()
 
         return self._message_service
+
+    def create_presence_manager(self, client: Client) -> PresenceManager:
+        if self._presence_manager is None:
+            self._presence_manager = PresenceManager(client=client)
+
+        return self._presence_manager
+
+    def create_attachment_cache(self) -> AttachmentCache:
+        if self._attachment_cache is None:
+            self._attachment_cache = AttachmentCache()
+
+        return self._attachment_cache
+
+    def create_yt_downloader(self) -> "YouTubeDownloader":
+        # Providers pull in yt_dlp and yandex_music, which take most of the startup time,
+        # so they are imported on first use, normally by the warm-up after login
+        if self._yt_downloader is None:
+            from services.music_downloaders.youtube import YouTubeDownloader  # noqa: PLC0415
+
+            self._yt_downloader = YouTubeDownloader(
+                cache_dir=self.settings.cached_music_dir,
+                extraction_processes=self.settings.youtube_extraction_processes,
+                download_pool=self.create_download_pool(),
+            )
+
+        return self._yt_downloader
+
+    def create_ym_downloader(self) -> "YandexMusicDownloader":
+        if self._ym_downloader is None:
+            from services.music_downloaders.yandex import YandexMusicDownloader  # noqa: PLC0415
+
+            self._ym_downloader = YandexMusicDownloader(
+                token=self.settings.tokens["yandex_music"],
+                cache_dir=self.settings.cached_music_dir,
+                transcoder=self.create_transcoder(),
+                download_pool=self.create_download_pool(),
+            )
+
+        return self._ym_downloader
+
+    def create_spotify_loader(self) -> "SpotifyInfoLoader":
+        if self._spotify_loader is None:
+            from services.music_info_loaders.spotify import SpotifyInfoLoader  # noqa: PLC0415
+
+            self._spotify_loader = SpotifyInfoLoader(
+                client_id=self.settings.tokens["spotify_client_id"],
+                client_secret=self.settings.tokens["spotify_client_secret"],
+            )
+
+        return self._spotify_loader
+
+    def create_source_cache(self) -> SourceCache:
+        if self._source_cache is None:
+            self._source_cache = SourceCache(cache_dir=self.settings.cached_music_dir)
+
+        return self._source_cache
+
+    def create_play_history(self) -> PlayHistory:
+        if self._play_history is None:
+            self._play_history = PlayHistory(cache_dir=self.settings.cached_music_dir)
+
+        return self._play_history
+
+    async def create_precacher(self) -> PreCacher:
+        return PreCacher(
+            play_history=self.create_play_history(),
+            download_service=await self.create_download_service(),
+            cache_dir=self.settings.cached_music_dir,
+            tracks_per_guild=self.settings.precache_tracks_per_guild,
+            max_bandwidth=self.settings.precache_max_bandwidth_kbps * 1000 // 8,
+            max_disk_usage=self.settings.precache_max_disk_mb * 1024 * 1024,
+        )
+
+    def create_download_pool(self) -> DownloadPool:
+        if self._download_pool is None:
+            self._download_pool = DownloadPool(workers=self.settings.download_workers)
+
+        return self._download_pool
+
+    def create_ffmpeg_governor(self) -> FFmpegGovernor:
+        if self._ffmpeg_governor is None:
+            self._ffmpeg_governor = FFmpegGovernor(
+                max_processes=self.settings.ffmpeg_max_processes,
+                niceness=self.settings.ffmpeg_niceness,
+            )
+
+        return self._ffmpeg_governor
+
+    def create_transcoder(self) -> Transcoder | None:
+        if self._transcoder is None and self.settings.transcoder_processes > 0:
+            self._transcoder = Transcoder(
+                cache_dir=self.settings.cached_music_dir,
+                processes=self.settings.transcoder_processes,
+            )
+
+        return self._transcoder
@@ -1,12 +1,21 @@
+import asyncio
 import configparser
+import io
+import os
+import tempfile
+from collections.abc import Callable
 from pathlib import Path
 
 from pydantic_settings import BaseSettings
 
+from core.logging import logger
 from core.models import AutoReply, UserSettings
 
 root_path = Path().parent
 
+DUMP_CONFIG_DELAY = 2.0
+CONFIG_WATCH_INTERVAL = 2.0
+
 
 class Settings(BaseSettings):
     command_prefix: str = "-"
@@ -22,49 +31,258 @@ class Settings(BaseSettings):
     bass_value: int = 0
     volume_value: int = 50
     tokens: dict = {}
+    log_format: str = "colour"
+    log_level: str = "INFO"
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int | None = None
+    watchdog_enabled: bool = False
+    watchdog_threshold: float = 0.25
+    warm_up_source: str | None = None
+    youtube_extraction_processes: int = 0
+    transcoder_processes: int = 1
+    ffmpeg_max_processes: int = 8
+    ffmpeg_niceness: int = 5
+    precache_enabled: bool = True
+    precache_tracks_per_guild: int = 20
+    # Kilobits per second, the default is about MAX_BANDWIDTH of the pre-cacher
+    precache_max_bandwidth_kbps: int = 8192
+    precache_max_disk_mb: int = 2048
+    tracing_file: Path | None = None
+    download_workers: int = 4
 
     def __init__(self) -> None:
         super().__init__()
         self._config = configparser.ConfigParser()
+        self._dump_requested = False
+        self._dump_handle: asyncio.TimerHandle | None = None
+        self._dump_task: asyncio.Task | None = None
+        self._config_mtime: int | None = None
+        self._reload_listeners: list[Callable[[], None]] = []
         self.load_config()
 
-    def load_config(self) -> None:  # noqa: C901
-        self._config.read(self.config_file, encoding="utf-8")
+    def load_config(self) -> None:
+        self._config_mtime = self._get_config_mtime()
+        self._apply_config(self._read_config())
+
+    async def reload_config(self) -> None:
+        """Re-read config.ini and apply it to the running bot without reconnecting."""
+        self._config_mtime = await asyncio.to_thread(self._get_config_mtime)
+        self._apply_config(await asyncio.to_thread(self._read_config))
+
+        for listener in self._reload_listeners:
+            listener()
+
+        logger.info("Config is reloaded")
+
+    async def watch_config(self) -> None:
+        while True:
+            await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+
+            if await asyncio.to_thread(self._get_config_mtime) == self._config_mtime:
+                continue
+
+            try:
+                await self.reload_config()
+            except (OSError, configparser.Error, ValueError, TypeError):
+                logger.exception("Can't reload config")
+
+    def add_reload_listener(self, listener: Callable[[], None]) -> None:
+        self._reload_listeners.append(listener)
+
+    def remove_reload_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self._reload_listeners:
+            self._reload_listeners.remove(listener)
+
+    def _read_config(self) -> configparser.ConfigParser:
+        config = configparser.ConfigParser()
+        config.read(self.config_file, encoding="utf-8")
 
-        if self._config.has_section("music"):
-            music_section = self._config["music"]
-            self.bass_value = music_section.getint("bass") or 0
-            self.volume_value = music_section.getint("volume") or 0
+        return config
 
-        if self._config.has_section("user_settings"):
-            user_settings_section = self._config["user_settings"]
+    def _get_config_mtime(self) -> int | None:
+        try:
+            return Path(self.config_file).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _apply_config(self, config: configparser.ConfigParser) -> None:  # noqa: C901, PLR0912, PLR0915
+        bass_value, volume_value = self.bass_value, self.volume_value
+        users_settings: dict[int, UserSettings] = {}
+        auto_replies: dict[str, AutoReply] = {}
+        channels: dict[str, int] = {}
+        tokens: dict[str, str] = {}
+        images: dict[str, Path] = {}
+        metrics_host, metrics_port = self.metrics_host, self.metrics_port
+        watchdog_enabled, watchdog_threshold = self.watchdog_enabled, self.watchdog_threshold
+        warm_up_source = self.warm_up_source
+        youtube_extraction_processes = self.youtube_extraction_processes
+        transcoder_processes = self.transcoder_processes
+        ffmpeg_max_processes, ffmpeg_niceness = self.ffmpeg_max_processes, self.ffmpeg_niceness
+        precache_enabled, precache_tracks_per_guild = self.precache_enabled, self.precache_tracks_per_guild
+        precache_max_bandwidth_kbps, precache_max_disk_mb = self.precache_max_bandwidth_kbps, self.precache_max_disk_mb
+        tracing_file = self.tracing_file
+        download_workers = self.download_workers
+
+        # Values changed by commands and not dumped yet are newer than the file
+        if config.has_section("music") and not self._dump_requested:
+            music_section = config["music"]
+            bass_value = music_section.getint("bass") or 0
+            volume_value = music_section.getint("volume") or 0
+
+        if config.has_section("user_settings"):
+            user_settings_section = config["user_settings"]
             for uid, setting in user_settings_section.items():
-                self.users_settings[int(uid)] = UserSettings(*setting.strip().split("::"))
+                users_settings[int(uid)] = UserSettings(*setting.strip().split("::"))
 
-        if self._config.has_section("auto_replies"):
-            auto_replies_section = self._config["auto_replies"]
+        if config.has_section("auto_replies"):
+            auto_replies_section = config["auto_replies"]
             for text, setting in auto_replies_section.items():
-                self.auto_replies[text.strip().lower()] = AutoReply(*setting.strip().split("::"))
+                auto_replies[text.strip().lower()] = AutoReply(*setting.strip().split("::"))
 
-        if self._config.has_section("channels"):
-            channels_section = self._config["channels"]
+        if config.has_section("channels"):
+            channels_section = config["channels"]
             for channel_name, channel_id in channels_section.items():
-                self.channels[channel_name] = int(channel_id)
+                channels[channel_name] = int(channel_id)
 
-        if self._config.has_section("tokens"):
-            tokens_section = self._config["tokens"]
-            for token_name, token in tokens_section.items():
-                self.tokens[token_name] = token
+        if config.has_section("tokens"):
+            tokens = dict(config["tokens"].items())
 
-        if self._config.has_section("images"):
-            images_section = self._config["images"]
+        if config.has_section("images"):
+            images_section = config["images"]
             for image_name, image_path in images_section.items():
-                self.images[image_name] = Path(image_path)
+                images[image_name] = Path(image_path)
+
+        if config.has_section("metrics"):
+            metrics_section = config["metrics"]
+            metrics_host = metrics_section.get("host", metrics_host)
+            metrics_port = metrics_section.getint("port")
+
+        if config.has_section("watchdog"):
+            watchdog_section = config["watchdog"]
+            watchdog_enabled = watchdog_section.getboolean("enabled", fallback=False)
+            watchdog_threshold = watchdog_section.getint("threshold_ms", fallback=250) / 1000
+
+        if config.has_section("warm_up"):
+            warm_up_source = config["warm_up"].get("source")
+
+        if config.has_section("youtube"):
+            # The worker pool is created with the downloader, so a change applies after restart
+            youtube_extraction_processes = config["youtube"].getint("extraction_processes", fallback=0)
+
+        if config.has_section("transcoder"):
+            # 0 keeps the cached tracks as they are downloaded
+            transcoder_processes = config["transcoder"].getint("processes", fallback=1)
+
+        if config.has_section("ffmpeg"):
+            # Applies after restart, the governor is created once
+            ffmpeg_section = config["ffmpeg"]
+            ffmpeg_max_processes = ffmpeg_section.getint("max_processes", fallback=8)
+            ffmpeg_niceness = ffmpeg_section.getint("niceness", fallback=5)
+
+        if config.has_section("precache"):
+            # Applies after restart, the pre-cacher is started once
+            precache_section = config["precache"]
+            precache_enabled = precache_section.getboolean("enabled", fallback=True)
+            precache_tracks_per_guild = precache_section.getint("tracks_per_guild", fallback=20)
+            precache_max_bandwidth_kbps = precache_section.getint("max_bandwidth_kbps", fallback=8192)
+            precache_max_disk_mb = precache_section.getint("max_disk_mb", fallback=2048)
+
+        if config.has_section("tracing"):
+            # Applies after restart, the exporter is configured on start
+            tracing_file = Path(file) if (file := config["tracing"].get("file")) else None
+
+        if config.has_section("downloads"):
+            # Applies after restart, the pool is created once
+            download_workers = config["downloads"].getint("workers", fallback=4)
+
+        # Everything is parsed before assignment, so the running cogs never see a half applied config
+        self._config = config
+        self.bass_value, self.volume_value = bass_value, volume_value
+        self.users_settings = users_settings
+        self.auto_replies = auto_replies
+        self.channels = channels
+        self.tokens = tokens
+        self.images = images
+        self.metrics_host, self.metrics_port = metrics_host, metrics_port
+        self.watchdog_enabled, self.watchdog_threshold = watchdog_enabled, watchdog_threshold
+        self.warm_up_source = warm_up_source
+        self.youtube_extraction_processes = youtube_extraction_processes
+        self.transcoder_processes = transcoder_processes
+        self.ffmpeg_max_processes, self.ffmpeg_niceness = ffmpeg_max_processes, ffmpeg_niceness
+        self.precache_enabled, self.precache_tracks_per_guild = precache_enabled, precache_tracks_per_guild
+        self.precache_max_bandwidth_kbps, self.precache_max_disk_mb = precache_max_bandwidth_kbps, precache_max_disk_mb
+        self.tracing_file = tracing_file
+        self.download_workers = download_workers
 
     def dump_config(self) -> None:
+        self._write_config(self._serialize_config())
+
+    def schedule_dump_config(self) -> None:
+        """Persist the config in background, repeated calls within DUMP_CONFIG_DELAY cost one write."""
+        self._dump_requested = True
+
+        if self._dump_handle is not None:
+            self._dump_handle.cancel()
+
+        self._dump_handle = asyncio.get_running_loop().call_later(DUMP_CONFIG_DELAY, self._start_dump_config)
+
+    async def flush_config(self) -> None:
+        """Write the scheduled changes right now, should be awaited before shutdown."""
+        if self._dump_handle is not None:
+            self._dump_handle.cancel()
+            self._dump_handle = None
+
+        if self._dump_requested:
+            self._start_dump_config()
+
+        if self._dump_task is not None:
+            await self._dump_task
+
+    def _start_dump_config(self) -> None:
+        self._dump_handle = None
+
+        if self._dump_task is None or self._dump_task.done():
+            self._dump_task = asyncio.create_task(self._dump_config_in_background())
+
+    async def _dump_config_in_background(self) -> None:
+        # Changes made during a write are picked up by the next iteration
+        while self._dump_requested:
+            self._dump_requested = False
+
+            try:
+                await asyncio.to_thread(self._write_config, self._serialize_config())
+            except OSError:
+                logger.exception("Can't dump config")
+
+    def _serialize_config(self) -> str:
         self._config["music"] = {}
         self._config["music"]["bass"] = str(self.bass_value)
         self._config["music"]["volume"] = str(self.volume_value)
 
-        with Path.open(Path(self.config_file), "w", encoding="utf-8") as config_file:
-            self._config.write(config_file)
+        buffer = io.StringIO()
+        self._config.write(buffer)
+
+        return buffer.getvalue()
+
+    def _write_config(self, text: str) -> None:
+        config_path = Path(self.config_file)
+
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=config_path.parent,
+            prefix=f".{config_path.name}.",
+            delete=False,
+        ) as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        try:
+            # Atomic only within a directory, so the config must be in a mounted directory, not a mounted file
+            Path(temp_file.name).replace(config_path)
+        except OSError:
+            Path(temp_file.name).unlink(missing_ok=True)
+            raise
+
+        self._config_mtime = self._get_config_mtime()
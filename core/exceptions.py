@@ -4,3 +4,7 @@ class CantDownloadError(Exception):
 
 class CantLoadTrackInfoError(Exception):
     pass
+
+
+class FFmpegOverloadError(Exception):
+    pass
@@ -1,4 +1,9 @@
+import atexit
+import json
 import logging
+import queue
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
 
 
 class _ColourFormatter(logging.Formatter):
@@ -35,9 +40,44 @@ class _ColourFormatter(logging.Formatter):
         return output
 
 
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue lives in this process, so the message is formatted only by the listener thread
+        return record
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
 handler = logging.StreamHandler()
 handler.setFormatter(_ColourFormatter())
 
+queue_handler = _LazyQueueHandler(_log_queue)
+
+_listener = QueueListener(_log_queue, handler, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
 logger = logging.getLogger("music_bot")
 logger.setLevel(logging.INFO)
-logger.addHandler(handler)
+logger.addHandler(queue_handler)
+
+
+def configure_logging(log_format: str = "colour", log_level: str = "INFO") -> None:
+    handler.setFormatter(_JsonFormatter() if log_format == "json" else _ColourFormatter())
+    logger.setLevel(log_level.upper())
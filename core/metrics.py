@@ -0,0 +1,354 @@
+import asyncio
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager, suppress
+
+from core.logging import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = tuple[str, ...]
+Collector = Callable[[], dict[LabelValues, float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values, strict=True)]
+    if extra:
+        pairs.append(extra)
+
+    return f"{{{','.join(pairs)}}}" if pairs else ""
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in list(self._values.items())
+        )
+
+        return lines
+
+
+class Gauge(Metric):
+    """Gauge which is either set directly or computed by a collector at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+        self._collectors: list[Collector] = []
+        self._blocking_collectors: list[Collector] = []
+
+    def set(self, *label_values: str, value: float) -> None:
+        self._values[label_values] = value
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def add_collector(self, collector: Collector, *, blocking: bool = False) -> None:
+        """Collectors read state of the event loop on it, blocking ones, e.g. of files or processes, run off it."""
+        if blocking:
+            self._blocking_collectors.append(collector)
+        else:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        for collectors in (self._collectors, self._blocking_collectors):
+            if collector in collectors:
+                collectors.remove(collector)
+
+    def collect_blocking(self) -> dict[LabelValues, float]:
+        return self._collect(self._blocking_collectors)
+
+    def render(self, blocking_values: dict[LabelValues, float] | None = None) -> list[str]:
+        values = dict(list(self._values.items()))
+        values.update(self._collect(self._collectors))
+        values.update(self.collect_blocking() if blocking_values is None else blocking_values)
+
+        lines = super().render()
+        lines.extend(
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in values.items()
+        )
+
+        return lines
+
+    def _collect(self, collectors: list[Collector]) -> dict[LabelValues, float]:
+        values = {}
+
+        for collector in list(collectors):
+            try:
+                values.update(collector())
+            except Exception:  # noqa: BLE001
+                logger.exception("Metric %s collector error", self.name)
+
+        return values
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self._buckets = buckets
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, *label_values: str, value: float) -> None:
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self._buckets) + 1)
+            self._sums[label_values] = 0.0
+
+        for i, bound in enumerate(self._buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+        self._sums[label_values] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Generator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*label_values, value=time.perf_counter() - started_at)
+
+    def get_count(self, *label_values: str) -> int:
+        return sum(self._counts.get(label_values, ()))
+
+    def render(self) -> list[str]:
+        lines = super().render()
+
+        for labels, counts in list(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip((*self._buckets, "+Inf"), list(counts), strict=True):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        counter = Counter(name, documentation, label_names)
+        self._register(counter)
+
+        return counter
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        gauge = Gauge(name, documentation, label_names)
+        self._register(gauge)
+
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        histogram = Histogram(name, documentation, label_names, buckets)
+        self._register(histogram)
+
+        return histogram
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    async def render_async(self) -> str:
+        """Run blocking collectors in a thread and the rest on the loop, whose state they read."""
+        gauges = [i for i in self._metrics.values() if isinstance(i, Gauge)]
+        blocking_values = await asyncio.to_thread(self._collect_blocking, gauges)
+        lines = []
+
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Gauge) and metric.name in blocking_values:
+                lines.extend(metric.render(blocking_values[metric.name]))
+            else:
+                lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _collect_blocking(gauges: list[Gauge]) -> dict[str, dict[LabelValues, float]]:
+        return {i.name: i.collect_blocking() for i in gauges}
+
+    def _register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            msg = f"Metric {metric.name} is already registered"
+            raise ValueError(msg)
+
+        self._metrics[metric.name] = metric
+
+
+class MetricsServer:
+    """Minimal HTTP server which serves the registry in Prometheus text format on /metrics."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int) -> None:
+        self._registry = registry
+        self._host = host
+        self._port = port
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+        logger.info("Metrics are served on %s:%s", self._host, self._port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def get_port(self) -> int | None:
+        if self._server is None or not self._server.sockets:
+            return None
+
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+
+            method, path, *_ = [*request_line.decode("latin-1").split(), "", ""]
+
+            if method == "GET" and path.split("?", maxsplit=1)[0] == "/metrics":
+                body = (await self._registry.render_async()).encode()
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body, status, content_type = b"Not found\n", "404 Not Found", "text/plain"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+registry = MetricsRegistry()
+
+DOWNLOAD_LATENCY = registry.histogram(
+    "music_bot_download_seconds",
+    "Time to get tracks of a source ready for the queue",
+    ("provider",),
+)
+METADATA_LATENCY = registry.histogram(
+    "music_bot_metadata_resolution_seconds",
+    "Time to resolve source metadata",
+    ("provider",),
+)
+CACHE_REQUESTS = registry.counter(
+    "music_bot_cache_requests_total",
+    "Cached music lookups",
+    ("provider", "result"),
+)
+SOURCE_CACHE_REQUESTS = registry.counter(
+    "music_bot_source_cache_requests_total",
+    "Resolved source lookups",
+    ("result",),
+)
+RESUMED_BYTES = registry.counter(
+    "music_bot_resumed_bytes_total",
+    "Bytes which weren't downloaded again thanks to resumed downloads",
+    ("provider",),
+)
+TRANSCODES = registry.counter(
+    "music_bot_transcodes_total",
+    "Cached tracks converted to opus",
+    ("result",),
+)
+TRANSCODE_LATENCY = registry.histogram("music_bot_transcode_seconds", "Time to convert a cached track to opus")
+PRECACHED_TRACKS = registry.counter(
+    "music_bot_precached_tracks_total",
+    "Most played tracks downloaded in advance",
+    ("result",),
+)
+PRECACHED_BYTES = registry.counter("music_bot_precached_bytes_total", "Bytes downloaded in advance")
+CACHE_BYTES = registry.gauge("music_bot_cache_bytes", "Size of cached music")
+QUEUE_LENGTH = registry.gauge("music_bot_queue_length", "Tracks in the queue", ("guild",))
+ACTIVE_FFMPEG_PROCESSES = registry.gauge("music_bot_ffmpeg_processes", "Running ffmpeg processes")
+FFMPEG_CPU_SECONDS = registry.gauge(
+    "music_bot_ffmpeg_cpu_seconds",
+    "CPU time used by a playback ffmpeg process",
+    ("session", "pid"),
+)
+FFMPEG_RSS_BYTES = registry.gauge(
+    "music_bot_ffmpeg_rss_bytes",
+    "Resident memory of a playback ffmpeg process",
+    ("session", "pid"),
+)
+FFMPEG_REJECTIONS = registry.counter(
+    "music_bot_ffmpeg_rejections_total",
+    "Sources which weren't played because of too many ffmpeg processes",
+)
+ACTIVE_DOWNLOADS = registry.gauge("music_bot_active_downloads", "Download pool workers which are busy")
+QUEUED_DOWNLOADS = registry.gauge("music_bot_queued_downloads", "Downloads waiting for a pool worker", ("session",))
+VOICE_RECONNECTS = registry.counter(
+    "music_bot_voice_reconnects_total",
+    "Voice connections restored after a drop",
+    ("result",),
+)
+EVENT_LOOP_LAG = registry.gauge("music_bot_event_loop_lag_seconds", "Last measured event loop lag")
+COMMAND_LATENCY = registry.histogram("music_bot_command_seconds", "Command handling time", ("command",))
+OUTBOX_DEPTH = registry.gauge("music_bot_outbox_depth", "Messages waiting to be sent", ("channel",))
+OUTBOX_MAX_DELAY = registry.gauge("music_bot_outbox_max_delay_seconds", "Max message delivery delay", ("channel",))
@@ -39,4 +39,6 @@ class TrackInfo:
     is_interrupting: bool
     title: str
     download_done: bool
+    # Played time and download state are refreshed from it while the rest of the line stays the same
+    track: Track
     queue_index: int = 0
@@ -0,0 +1,38 @@
+import os
+import threading
+
+from core.logging import logger
+
+BACKGROUND_NICENESS = 10
+# Best effort class levels, from 0 which is the highest to 7
+BACKGROUND_IO_PRIORITY = 7
+
+
+def lower_thread_priority(niceness: int = BACKGROUND_NICENESS) -> None:
+    """Renice the calling thread, so background work doesn't compete with the event loop and audio threads.
+
+    Linux applies niceness per thread, on other platforms this is a no-op.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError) as e:
+        logger.debug("Can't lower thread priority: %s", e)
+
+
+def lower_process_priority(
+    pid: int,
+    niceness: int = BACKGROUND_NICENESS,
+    io_priority: int = BACKGROUND_IO_PRIORITY,
+) -> None:
+    """Renice a child process, like ffmpeg, and set its IO priority where the platform supports it."""
+    import psutil  # noqa: PLC0415
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, pid, niceness)
+    except (AttributeError, OSError) as e:
+        logger.debug("Can't lower priority of process %s: %s", pid, e)
+
+    try:
+        psutil.Process(pid).ionice(psutil.IOPRIO_CLASS_BE, io_priority)
+    except (AttributeError, psutil.Error, OSError) as e:
+        logger.debug("Can't set IO priority of process %s: %s", pid, e)
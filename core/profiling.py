@@ -0,0 +1,118 @@
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from types import CodeType, FrameType
+
+SAMPLE_INTERVAL = 0.01
+TOP_ALLOCATIONS = 25
+
+
+@dataclass
+class ProfileResult:
+    duration: float
+    samples: int = 0
+    thread_names: set[str] = field(default_factory=set)
+    # Stacks are folded, root first and frames separated by ";", the format of flamegraph.pl and speedscope
+    wall_stacks: Counter[str] = field(default_factory=Counter)
+    # Weighted by microseconds of the thread's CPU time since the previous sample
+    cpu_stacks: Counter[str] = field(default_factory=Counter)
+    allocations: list[str] = field(default_factory=list)
+
+    @staticmethod
+    def to_folded(stacks: Counter[str]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class _FrameFormatter:
+    def __init__(self) -> None:
+        # The longest matching prefix is cut, so site-packages win over the prefix they are in
+        self._path_prefixes = sorted({i.rstrip("/") + "/" for i in sys.path if i}, key=len, reverse=True)
+        self._labels: dict[CodeType, str] = {}
+
+    def format_stack(self, thread_name: str, frame: FrameType | None) -> str:
+        labels = []
+
+        while frame is not None:
+            labels.append(self._get_label(frame.f_code))
+            frame = frame.f_back
+
+        labels.append(f"thread:{thread_name}")
+
+        return ";".join(reversed(labels))
+
+    def _get_label(self, code: CodeType) -> str:
+        if (label := self._labels.get(code)) is None:
+            file_name = code.co_filename
+            for prefix in self._path_prefixes:
+                if file_name.startswith(prefix):
+                    file_name = file_name.removeprefix(prefix)
+                    break
+
+            label = self._labels[code] = f"{code.co_qualname}({file_name}:{code.co_firstlineno})".replace(";", ":")
+
+        return label
+
+
+def profile(duration: float, interval: float = SAMPLE_INTERVAL) -> ProfileResult:
+    """Sample stacks of all threads for the duration, blocking, so it should be called in its own thread.
+
+    Every sample adds one to the wall clock stack of each thread, waiting included, and the CPU time the thread
+    used since the previous sample to its CPU stack. Allocations are compared between the start and the end.
+    """
+    result = ProfileResult(duration=duration)
+    formatter = _FrameFormatter()
+    sampler_id = threading.get_ident()
+    cpu_times: dict[int, float] = {}
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+
+    try:
+        snapshot = tracemalloc.take_snapshot()
+        deadline = time.monotonic() + duration
+
+        while time.monotonic() < deadline:
+            threads = {i.ident: i for i in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():  # noqa: SLF001
+                if thread_id == sampler_id:
+                    continue
+
+                thread = threads.get(thread_id)
+                thread_name = thread.name if thread is not None else str(thread_id)
+                stack = formatter.format_stack(thread_name, frame)
+                result.thread_names.add(thread_name)
+                result.wall_stacks[stack] += 1
+
+                if thread is None or thread.native_id is None:
+                    continue
+
+                if (cpu_time := _get_thread_cpu_time(thread.native_id)) is not None:
+                    if (previous := cpu_times.get(thread_id)) is not None and cpu_time > previous:
+                        result.cpu_stacks[stack] += round((cpu_time - previous) * 1_000_000)
+
+                    cpu_times[thread_id] = cpu_time
+
+            result.samples += 1
+            time.sleep(interval)
+
+        statistics = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")
+        result.allocations = [str(i) for i in statistics[:TOP_ALLOCATIONS]]
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+    return result
+
+
+def _get_thread_cpu_time(native_id: int) -> float | None:
+    # Linux CPU clock of a thread by its kernel id. Unlike pthread_getcpuclockid it's safe for a thread which has
+    # just finished, the clock is just invalid then.
+    try:
+        return time.clock_gettime((~native_id << 3) | 6)
+    except OSError:
+        return None
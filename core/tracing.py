@@ -0,0 +1,170 @@
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from core.logging import logger
+
+
+@dataclass
+class Span:
+    name: str
+    request_id: str
+    span_id: str
+    parent_id: str | None
+    started_at: float
+    duration: float | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    _started_perf: float = field(default=0.0, repr=False)
+    _token: Token | None = field(default=None, repr=False)
+
+    def set(self, **attributes: Any) -> None:  # noqa: ANN401
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "request_id": self.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """Appends finished spans to a JSON lines file, serialization and writes happen in its own thread."""
+
+    def __init__(self, file_path: Path) -> None:
+        self._file_path = Path(file_path)
+        self._queue: queue.SimpleQueue[Span | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write(self) -> None:
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._file_path.open("a", encoding="utf-8") as file:
+            while (span := self._queue.get()) is not None:
+                try:
+                    file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+                    if self._queue.empty():
+                        file.flush()
+                except (OSError, ValueError):
+                    logger.exception("Can't export span %s", span.name)
+
+
+_exporter: SpanExporter | None = None
+
+
+def configure_tracing(file_path: Path | None) -> None:
+    """Export spans to the file, tracing is off and spans cost nothing when it isn't set."""
+    global _exporter  # noqa: PLW0603
+
+    if _exporter is not None:
+        atexit.unregister(_exporter.close)
+        _exporter.close()
+        _exporter = None
+
+    if file_path is not None:
+        _exporter = SpanExporter(file_path)
+        atexit.register(_exporter.close)
+
+
+def get_current_span() -> Span | None:
+    return _current_span.get()
+
+
+def start_span(name: str, **attributes: Any) -> Span | None:  # noqa: ANN401
+    """Start a child of the current span, or a new request when there is no current span."""
+    if _exporter is None:
+        return None
+
+    parent = _current_span.get()
+    span = _create_span(name, parent, attributes)
+    span._token = _current_span.set(span)  # noqa: SLF001
+
+    return span
+
+
+def finish_span(span: Span | None, error: BaseException | None = None) -> None:
+    if span is None:
+        return
+
+    span.duration = time.perf_counter() - span._started_perf  # noqa: SLF001
+    if error is not None:
+        span.error = repr(error)
+
+    if span._token is not None:  # noqa: SLF001
+        # Finished in another context, e.g. by a hook which runs in another task
+        with suppress(ValueError):
+            _current_span.reset(span._token)  # noqa: SLF001
+
+        span._token = None  # noqa: SLF001
+
+    if _exporter is not None:
+        _exporter.export(span)
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Generator[Span | None]:  # noqa: ANN401
+    span = start_span(name, **attributes)
+
+    try:
+        yield span
+    except BaseException as e:
+        finish_span(span, e)
+        raise
+    else:
+        finish_span(span)
+
+
+def annotate(**attributes: Any) -> None:  # noqa: ANN401
+    """Add attributes to the current span, like a result which is known only at the end."""
+    if (span := _current_span.get()) is not None:
+        span.set(**attributes)
+
+
+def record_span(name: str, parent: Span | None, duration: float, **attributes: Any) -> None:  # noqa: ANN401
+    """Export a span which has already ended, for work which isn't done in the context of its request."""
+    if _exporter is None:
+        return
+
+    span = _create_span(name, parent, attributes)
+    span.started_at -= duration
+    span.duration = duration
+    _exporter.export(span)
+
+
+def _create_span(name: str, parent: Span | None, attributes: dict[str, Any]) -> Span:
+    return Span(
+        name=name,
+        request_id=parent.request_id if parent is not None else uuid.uuid4().hex[:16],
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent is not None else None,
+        started_at=time.time(),
+        attributes=attributes,
+        _started_perf=time.perf_counter(),
+    )
@@ -0,0 +1,98 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+
+from core.logging import logger
+from core.metrics import EVENT_LOOP_LAG
+
+HEARTBEAT_INTERVAL = 0.1
+
+current_command: ContextVar[str | None] = ContextVar("current_command", default=None)
+
+
+class LoopWatchdog:
+    """Measures event loop lag and, if a block threshold is given, logs the stack of callbacks blocking the loop.
+
+    The loop only wakes up for a heartbeat every HEARTBEAT_INTERVAL, blocking detection runs in its own thread
+    and doesn't touch the loop at all.
+    """
+
+    def __init__(self, block_threshold: float | None = None, heartbeat_interval: float = HEARTBEAT_INTERVAL) -> None:
+        self._block_threshold = block_threshold
+        self._heartbeat_interval = heartbeat_interval
+        self._last_heartbeat = time.monotonic()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._detector_thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self.max_lag = 0.0
+        self.blocks_detected = 0
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+        if self._block_threshold is not None:
+            self._detector_thread = threading.Thread(target=self._detect_blocking, name="loop-watchdog", daemon=True)
+            self._detector_thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            self._last_heartbeat = started_at
+            await asyncio.sleep(self._heartbeat_interval)
+
+            lag = max(time.monotonic() - started_at - self._heartbeat_interval, 0.0)
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG.set(value=lag)
+
+            if self._block_threshold is not None and lag > self._block_threshold:
+                logger.warning("Event loop was blocked for %.3fs", lag)
+
+    def _detect_blocking(self) -> None:
+        if self._block_threshold is None:
+            return
+
+        reported_heartbeat = None
+
+        while not self._stopped.wait(self._block_threshold / 2):
+            last_heartbeat = self._last_heartbeat
+            blocked_for = time.monotonic() - last_heartbeat - self._heartbeat_interval
+
+            # A stall is reported once, with the stack captured while the loop is still stuck
+            if blocked_for > self._block_threshold and reported_heartbeat != last_heartbeat:
+                reported_heartbeat = last_heartbeat
+                self.blocks_detected += 1
+
+                try:
+                    self._report_block(blocked_for)
+                except Exception:  # noqa: BLE001
+                    logger.exception("Can't report blocked event loop")
+
+    def _report_block(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id or 0)  # noqa: SLF001
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unknown>\n"
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        command = task.get_context().get(current_command) if task is not None else None
+
+        logger.warning(
+            "Event loop is blocked for %.3fs, command - %s, task - %s\n%s",
+            blocked_for,
+            command,
+            task.get_name() if task is not None else None,
+            stack,
+        )
@@ -1,33 +1,45 @@
 import discord
 from discord.ext.commands import Bot
 
+from bot.cogs.monitoring import MonitoringCog
 from bot.cogs.music import MusicCog
 from bot.cogs.system import SystemCog
 from bot.factory import ServiceFactory
 from config.settings import Settings
-from core.logging import logger
+from core.logging import configure_logging, logger, queue_handler
+from core.tracing import configure_tracing
+
+
+def create_bot(settings: Settings) -> Bot:
+    bot = Bot(
+        command_prefix=settings.command_prefix,
+        intents=discord.Intents.all(),
+    )
+
+    @bot.event
+    async def setup_hook() -> None:
+        service_factory = ServiceFactory(settings=settings)
+        await bot.add_cog(
+            MusicCog(
+                bot=bot,
+                service_factory=service_factory,
+                settings=settings,
+            )
+        )
+        await bot.add_cog(SystemCog(bot=bot, settings=settings, service_factory=service_factory))
+        await bot.add_cog(MonitoringCog(bot=bot, settings=settings, service_factory=service_factory))
+
+    return bot
+
 
 if __name__ == "__main__":
-    logger.info("Start app")
     settings = Settings()
+    configure_logging(settings.log_format, settings.log_level)
+    configure_tracing(settings.tracing_file)
+    logger.info("Start app")
     settings.restart = True
 
     while settings.restart:
         settings.restart = False
-        bot = Bot(
-            command_prefix=settings.command_prefix,
-            intents=discord.Intents.all(),
-        )
-
-        @bot.event
-        async def setup_hook(bot: Bot = bot) -> None:
-            await bot.add_cog(
-                MusicCog(
-                    bot=bot,
-                    service_factory=ServiceFactory(settings=settings),
-                    settings=settings,
-                )
-            )
-            await bot.add_cog(SystemCog(bot=bot, settings=settings, service_factory=ServiceFactory(settings=settings)))
-
-        bot.run(settings.tokens.get("discord", ""))
+        bot = create_bot(settings)
+        bot.run(settings.tokens.get("discord", ""), log_handler=queue_handler)
@@ -31,6 +31,9 @@ class SpotifyApiClient:
     async def get_playlist_tracks(self, uri: str) -> dict:
         return await self.make_spotify_req(self.API_BASE + f"playlists/{uri}/tracks")
 
+    async def fetch_token(self) -> None:
+        await self._get_token()
+
     async def make_spotify_req(self, url: str) -> dict:
         token = await self._get_token()
         return await self._make_request(url, headers={"Authorization": f"Bearer {token}"})
@@ -62,7 +65,7 @@ class SpotifyApiClient:
 
         token["expires_at"] = int(time.time()) + token["expires_in"]
         self.token = token
-        logger.debug("Created a new access token: %s", str(token))
+        logger.debug("Created a new access token: %s", token)
         return self.token["access_token"]
 
     @staticmethod
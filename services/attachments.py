@@ -0,0 +1,99 @@
+import asyncio
+import io
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from urllib import parse
+
+from discord import Embed, File, Message
+from discord.abc import Messageable
+
+from core.logging import logger
+
+IMAGES_DIR = Path("images")
+# Signed CDN links are refreshed a bit before they really expire
+URL_EXPIRATION_MARGIN = 3600
+
+
+@dataclass
+class CachedAttachment:
+    data: bytes
+    url: str | None = None
+    url_expires_at: float | None = None
+    message_id: int | None = None
+
+    def get_url(self) -> str | None:
+        if self.url_expires_at is not None and self.url_expires_at - URL_EXPIRATION_MARGIN < time.time():
+            self.url = self.url_expires_at = self.message_id = None
+
+        return self.url
+
+
+class AttachmentCache:
+    """Keeps images in memory and reuses the CDN link of an already uploaded image."""
+
+    def __init__(self, images_dir: Path = IMAGES_DIR) -> None:
+        self._images_dir = images_dir
+        self._attachments: dict[str, CachedAttachment] = {}
+
+    async def preload(self, image_names: Iterable[str]) -> None:
+        for image_name in image_names:
+            try:
+                await self._get(image_name)
+            except OSError as e:
+                logger.warning("Can't preload image %s: %s", image_name, e)
+
+    def clear(self) -> None:
+        self._attachments.clear()
+
+    def forget_message(self, message_id: int) -> None:
+        """The CDN link dies with its message, so the image should be uploaded again."""
+        for attachment in self._attachments.values():
+            if attachment.message_id == message_id:
+                attachment.url = attachment.url_expires_at = attachment.message_id = None
+
+    async def send(
+        self,
+        channel: Messageable,
+        image_name: str,
+        *,
+        content: str,
+        tts: bool = False,
+        delete_after: float | None = None,
+    ) -> Message:
+        attachment = await self._get(image_name)
+
+        # Messages which will be deleted can't share their links
+        if delete_after is None and (url := attachment.get_url()):
+            return await channel.send(content=content, tts=tts, embed=Embed().set_image(url=url))
+
+        file = File(io.BytesIO(attachment.data), filename=Path(image_name).name)
+
+        if delete_after is None:
+            message = await channel.send(content=content, tts=tts, file=file)
+        else:
+            message = await channel.send(content=content, tts=tts, file=file, delete_after=delete_after)
+
+        if delete_after is None and message.attachments:
+            attachment.url = message.attachments[0].url
+            attachment.url_expires_at = self._get_url_expiration(attachment.url)
+            attachment.message_id = message.id
+
+        return message
+
+    async def _get(self, image_name: str) -> CachedAttachment:
+        if (attachment := self._attachments.get(image_name)) is None:
+            data = await asyncio.to_thread(self._images_dir.joinpath(image_name).read_bytes)
+            attachment = self._attachments[image_name] = CachedAttachment(data=data)
+
+        return attachment
+
+    @staticmethod
+    def _get_url_expiration(url: str) -> float | None:
+        expires_at = parse.parse_qs(parse.urlparse(url).query).get("ex")
+
+        try:
+            return float(int(expires_at[0], 16)) if expires_at else None
+        except ValueError:
+            return None
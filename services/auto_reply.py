@@ -0,0 +1,90 @@
+from collections import deque
+
+from core.models import AutoReply
+
+NO_MATCH = -1
+
+
+class AutoReplyMatcher:
+    """Aho-Corasick automaton over auto-reply phrases.
+
+    A message is scanned once regardless of the rules count, the earliest configured rule wins,
+    like with checking the rules one by one.
+    """
+
+    def __init__(self, auto_replies: dict[str, AutoReply]) -> None:
+        self._replies = list(auto_replies.values())
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[int] = [NO_MATCH]
+
+        for index, text in enumerate(auto_replies):
+            self._add_phrase(text.strip().lower(), index)
+
+        self._build_fail_links()
+
+    def match(self, content: str) -> AutoReply | None:
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = best[0]
+
+        for char in content.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(char, 0)
+            rule_index = best[state]
+
+            if rule_index != NO_MATCH and (found == NO_MATCH or rule_index < found):
+                found = rule_index
+
+                if found == 0:
+                    break
+
+        return self._replies[found] if found != NO_MATCH else None
+
+    def _add_phrase(self, phrase: str, index: int) -> None:
+        state = 0
+
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(NO_MATCH)
+                self._goto[state][char] = next_state
+
+            state = next_state
+
+        if self._best[state] == NO_MATCH:
+            self._best[state] = index
+
+    def _build_fail_links(self) -> None:
+        states = deque(self._goto[0].values())
+
+        while states:
+            state = states.popleft()
+
+            for char, next_state in self._goto[state].items():
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                self._best[next_state] = self._min_rule_index(
+                    self._best[next_state],
+                    self._best[self._fail[next_state]],
+                )
+                states.append(next_state)
+
+    @staticmethod
+    def _min_rule_index(first: int, second: int) -> int:
+        if first == NO_MATCH:
+            return second
+
+        if second == NO_MATCH:
+            return first
+
+        return min(first, second)
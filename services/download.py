@@ -1,10 +1,16 @@
 from enum import StrEnum
+from typing import TYPE_CHECKING
 from urllib import parse
 
+from core.metrics import DOWNLOAD_LATENCY, METADATA_LATENCY
 from core.models import Track
-from services.music_downloaders.yandex import YandexMusicDownloader
-from services.music_downloaders.youtube import YouTubeDownloader
-from services.music_info_loaders.spotify import SpotifyInfoLoader
+from core.tracing import annotate, trace
+from services.source_cache import SourceCache
+
+if TYPE_CHECKING:
+    from services.music_downloaders.yandex import YandexMusicDownloader
+    from services.music_downloaders.youtube import YouTubeDownloader
+    from services.music_info_loaders.spotify import SpotifyInfoLoader
 
 
 class SearchDomains(StrEnum):
@@ -16,13 +22,15 @@ class SearchDomains(StrEnum):
 class DownloadService:
     def __init__(
         self,
-        yt_downloader: YouTubeDownloader,
-        ym_downloader: YandexMusicDownloader,
-        spotify_loader: SpotifyInfoLoader,
+        yt_downloader: "YouTubeDownloader",
+        ym_downloader: "YandexMusicDownloader",
+        spotify_loader: "SpotifyInfoLoader",
+        source_cache: SourceCache,
     ) -> None:
         self._yt_downloader = yt_downloader
         self._ym_downloader = ym_downloader
         self._spotify_loader = spotify_loader
+        self._source_cache = source_cache
 
     async def download(
         self,
@@ -30,32 +38,54 @@ class DownloadService:
         *,
         only_one: bool = False,
         force_load_first: bool = False,
+        urgent: bool = True,
     ) -> list[Track]:
+        """Tracks which are loaded first are urgent downloads, background callers pass urgent=False."""
+        with trace("download_service.download", source=source, only_one=only_one):
+            if (tracks := await self._source_cache.get(source, only_one=only_one)) is not None:
+                annotate(source_cache="hit", tracks=len(tracks))
+
+                return tracks
+
+            tracks = await self._resolve(source, only_one=only_one, force_load_first=force_load_first, urgent=urgent)
+            self._source_cache.put(source, tracks, only_one=only_one)
+            annotate(source_cache="miss", tracks=len(tracks))
+
+            return tracks
+
+    async def _resolve(self, source: str, *, only_one: bool, force_load_first: bool, urgent: bool) -> list[Track]:
         parsed_url = parse.urlparse(source)
         netloc = parsed_url.netloc
         tracks = []
 
         if netloc.startswith(SearchDomains.yandex_music):
-            tracks = await self._ym_downloader.download(
-                source=source,
-                only_one=only_one,
-                force_load_first=force_load_first,
-            )
+            with DOWNLOAD_LATENCY.time("yandex_music"):
+                tracks = await self._ym_downloader.download(
+                    source=source,
+                    only_one=only_one,
+                    force_load_first=force_load_first,
+                    urgent=urgent,
+                )
         elif netloc.startswith(SearchDomains.spotify):
-            track_names = await self._spotify_loader.get_track_names(source=source)
+            with DOWNLOAD_LATENCY.time("spotify"):
+                with METADATA_LATENCY.time("spotify"), trace("spotify.track_names", source=source):
+                    track_names = await self._spotify_loader.get_track_names(source=source)
 
-            if only_one and len(track_names) > 1:
-                track_names = [track_names[0]]
+                if only_one and len(track_names) > 1:
+                    track_names = [track_names[0]]
 
-            tracks = await self._yt_downloader.batch_download_by_track_names(
-                track_names=track_names,
-                force_load_first=force_load_first,
-            )
+                tracks = await self._yt_downloader.batch_download_by_track_names(
+                    track_names=track_names,
+                    force_load_first=force_load_first,
+                    urgent=urgent,
+                )
         else:
-            tracks = await self._yt_downloader.download(
-                source=source,
-                only_one=only_one,
-                force_load_first=force_load_first,
-            )
+            with DOWNLOAD_LATENCY.time("youtube"):
+                tracks = await self._yt_downloader.download(
+                    source=source,
+                    only_one=only_one,
+                    force_load_first=force_load_first,
+                    urgent=urgent,
+                )
 
         return tracks
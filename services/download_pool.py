@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+from collections import deque
+from collections.abc import Awaitable, Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
+
+from core.logging import logger
+
+DOWNLOAD_WORKERS = 4
+# Workers background downloads can't take, so a track which is going to be played never waits for a whole batch
+RESERVED_WORKERS = 1
+CLOSE_TIMEOUT = 10.0
+DEFAULT_SESSION = "default"
+
+current_session: contextvars.ContextVar[str] = contextvars.ContextVar("download_session", default=DEFAULT_SESSION)
+
+
+@contextmanager
+def download_session(session: str) -> Generator[None]:
+    """Downloads submitted inside belong to the session, usually a guild, and are scheduled fairly with others."""
+    token = current_session.set(session)
+
+    try:
+        yield
+    finally:
+        current_session.reset(token)
+
+
+@dataclass
+class _Job:
+    start: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    context: contextvars.Context
+    urgent: bool
+
+
+@dataclass(frozen=True)
+class DownloadPoolStats:
+    active: int
+    queued: dict[str, int]
+
+
+class DownloadPool:
+    """Process wide limit of concurrent downloads.
+
+    Every session has its own queue and sessions take turns, so a long playlist of one guild doesn't delay
+    the tracks of the others. Urgent jobs, like a track which is going to be played now, go before the others
+    and have a reserved worker. A background job becomes urgent when someone starts to wait for it, see promote.
+    Blocking downloads run in the pool's own threads, which are never more than workers.
+    """
+
+    def __init__(self, workers: int = DOWNLOAD_WORKERS) -> None:
+        self._workers = max(workers, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="download")
+        # Insertion ordered, the session which got the last slot is moved to the end
+        self._queues: dict[str, deque[_Job]] = {}
+        self._active: set[asyncio.Task] = set()
+        self._active_background: set[asyncio.Task] = set()
+        self._background_workers = max(self._workers - RESERVED_WORKERS, 1)
+        self._closed = False
+
+    def submit(self, start: Callable[[], Awaitable[Any]], *, urgent: bool = False) -> asyncio.Future:
+        if self._closed:
+            msg = "Download pool is closed"
+            raise RuntimeError(msg)
+
+        job = _Job(
+            start=start,
+            future=asyncio.get_running_loop().create_future(),
+            context=contextvars.copy_context(),
+            urgent=urgent,
+        )
+        session_queue = self._queues.setdefault(current_session.get(), deque())
+
+        if urgent:
+            session_queue.appendleft(job)
+        else:
+            session_queue.append(job)
+
+        self._dispatch()
+
+        return job.future
+
+    def submit_blocking(self, fn: Callable[..., Any], *args: Any, urgent: bool = False) -> asyncio.Future:  # noqa: ANN401
+        loop = asyncio.get_running_loop()
+
+        return self.submit(lambda: loop.run_in_executor(self._executor, partial(fn, *args)), urgent=urgent)
+
+    def promote(self, future: asyncio.Future) -> None:
+        """Make the queued job of the future urgent, a job which has already started is left as it is."""
+        for session_queue in self._queues.values():
+            for job in session_queue:
+                if job.future is future:
+                    session_queue.remove(job)
+                    job.urgent = True
+                    session_queue.appendleft(job)
+                    self._dispatch()
+
+                    return
+
+    def cancel(self, session: str) -> None:
+        """Drop queued downloads of the session, the running ones are finished."""
+        for job in self._queues.pop(session, ()):
+            job.future.cancel()
+
+    async def close(self) -> None:
+        """Drop queued downloads and give the running ones some time to finish.
+
+        Downloads which are still running after that are finished by their threads, and a download cut off by
+        an exit is resumed from its .part file.
+        """
+        self._closed = True
+
+        for session in list(self._queues):
+            self.cancel(session)
+
+        if self._active:
+            _, pending = await asyncio.wait(self._active, timeout=CLOSE_TIMEOUT)
+            if pending:
+                logger.warning("%s downloads are still running on close", len(pending))
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> DownloadPoolStats:
+        return DownloadPoolStats(
+            active=len(self._active),
+            queued={session: len(i) for session, i in self._queues.items()},
+        )
+
+    def _dispatch(self) -> None:
+        while len(self._active) < self._workers and (job := self._take_next()) is not None:
+            # The caller isn't waiting for it anymore
+            if job.future.cancelled():
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._run(job), context=job.context)
+            self._active.add(task)
+            if not job.urgent:
+                self._active_background.add(task)
+            task.add_done_callback(self._on_job_done)
+
+    def _take_next(self) -> _Job | None:
+        # Urgent jobs are at the front of their session's queues
+        session = next((session for session, i in self._queues.items() if i[0].urgent), None)
+
+        if session is None:
+            if not self._queues or len(self._active_background) >= self._background_workers:
+                return None
+
+            session = next(iter(self._queues))
+
+        session_queue = self._queues.pop(session)
+        job = session_queue.popleft()
+
+        if session_queue:
+            self._queues[session] = session_queue
+
+        return job
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            result = await job.start()
+        except Exception as e:  # noqa: BLE001
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _on_job_done(self, task: asyncio.Task) -> None:
+        self._active.discard(task)
+        self._active_background.discard(task)
+
+        with suppress(asyncio.CancelledError):
+            task.result()
+
+        if not self._closed:
+            self._dispatch()
@@ -0,0 +1,182 @@
+import asyncio
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from discord import FFmpegAudio, FFmpegOpusAudio, FFmpegPCMAudio
+
+from core.exceptions import FFmpegOverloadError
+from core.logging import logger
+from core.metrics import FFMPEG_REJECTIONS
+from core.priority import lower_process_priority
+
+MAX_PROCESSES = 8
+PLAYBACK_NICENESS = 5
+# Reads of the playing tracks go before downloads and transcoding
+PLAYBACK_IO_PRIORITY = 2
+QUEUE_TIMEOUT = 10.0
+SLOT_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class GovernedProcess:
+    session: int
+    process: subprocess.Popen
+    started_at: float
+    # Paused source which is going to be resumed, e.g. a track interrupted by another one
+    suspended: bool = False
+
+
+@dataclass(frozen=True)
+class ProcessStats:
+    session: int
+    pid: int
+    cpu_seconds: float
+    rss_bytes: int
+
+
+class FFmpegGovernor:
+    """Keeps track of the playback ffmpeg processes of all sessions and limits them.
+
+    A new source waits for a free slot up to QUEUE_TIMEOUT and is rejected after that. Processes are spawned
+    and killed in discord.py's audio threads, so the registry is guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        max_processes: int = MAX_PROCESSES,
+        niceness: int = PLAYBACK_NICENESS,
+        io_priority: int = PLAYBACK_IO_PRIORITY,
+    ) -> None:
+        self._max_processes = max_processes
+        self._niceness = niceness
+        self._io_priority = io_priority
+        self._lock = threading.Lock()
+        self._processes: dict[int, GovernedProcess] = {}
+
+    async def acquire(self, session: int) -> None:
+        """Wait until one more process can be spawned for the session."""
+        # A session plays one source at a time, so its processes which are still alive are leftovers
+        self.release(session, keep_suspended=True)
+
+        try:
+            await asyncio.wait_for(self._wait_for_slot(), QUEUE_TIMEOUT)
+        except TimeoutError:
+            FFMPEG_REJECTIONS.inc()
+            msg = "Too many tracks are playing right now, try again later"
+            raise FFmpegOverloadError(msg) from None
+
+    def release(self, session: int, *, keep_suspended: bool = False) -> None:
+        """Kill the processes of the session, e.g. after it left the voice channel."""
+        with self._lock:
+            governed_processes = [
+                i for i in self._processes.values() if i.session == session and not (keep_suspended and i.suspended)
+            ]
+
+        for governed_process in governed_processes:
+            if governed_process.process.poll() is None:
+                logger.warning("Kill leftover ffmpeg process %s", governed_process.process.pid)
+                governed_process.process.kill()
+                governed_process.process.wait()
+
+            self.unregister(governed_process.process)
+
+    def register(self, session: int, process: subprocess.Popen) -> None:
+        lower_process_priority(process.pid, self._niceness, self._io_priority)
+
+        with self._lock:
+            self._processes[process.pid] = GovernedProcess(
+                session=session,
+                process=process,
+                started_at=time.monotonic(),
+            )
+
+    def unregister(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.pop(process.pid, None)
+
+    def set_suspended(self, process: subprocess.Popen, *, suspended: bool) -> None:
+        with self._lock:
+            if (governed_process := self._processes.get(process.pid)) is not None:
+                governed_process.suspended = suspended
+
+    def get_running_count(self) -> int:
+        self._reap()
+
+        with self._lock:
+            return len(self._processes)
+
+    def get_stats(self) -> list[ProcessStats]:
+        import psutil  # noqa: PLC0415
+
+        self._reap()
+
+        with self._lock:
+            governed_processes = list(self._processes.values())
+
+        stats = []
+        for governed_process in governed_processes:
+            try:
+                process = psutil.Process(governed_process.process.pid)
+                with process.oneshot():
+                    cpu_times = process.cpu_times()
+                    stats.append(
+                        ProcessStats(
+                            session=governed_process.session,
+                            pid=process.pid,
+                            cpu_seconds=cpu_times.user + cpu_times.system,
+                            rss_bytes=process.memory_info().rss,
+                        )
+                    )
+            except psutil.Error:
+                continue
+
+        return stats
+
+    async def _wait_for_slot(self) -> None:
+        # Processes exit on their own or in the audio threads, polling is simpler than waking the loop from there
+        while self.get_running_count() >= self._max_processes:  # noqa: ASYNC110
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+    def _reap(self) -> None:
+        # poll() also collects the zombies of processes which exited on their own
+        with self._lock:
+            exited = [pid for pid, i in self._processes.items() if i.process.poll() is not None]
+
+            for pid in exited:
+                del self._processes[pid]
+
+
+class _GovernedFFmpegAudio(FFmpegAudio):
+    def __init__(self, *args: Any, governor: FFmpegGovernor, session: int, **kwargs: Any) -> None:  # noqa: ANN401
+        self._governor = governor
+        self._session = session
+        super().__init__(*args, **kwargs)
+
+    def _spawn_process(self, args: Any, **subprocess_kwargs: Any) -> subprocess.Popen:  # noqa: ANN401
+        process = super()._spawn_process(args, **subprocess_kwargs)
+        self._governor.register(self._session, process)
+
+        return process
+
+    def set_suspended(self, *, suspended: bool) -> None:
+        if isinstance(process := getattr(self, "_process", None), subprocess.Popen):
+            self._governor.set_suspended(process, suspended=suspended)
+
+    def _kill_process(self) -> None:
+        process = getattr(self, "_process", None)
+        super()._kill_process()
+
+        # discord.py sets _process to MISSING after cleanup
+        if isinstance(process, subprocess.Popen):
+            self._governor.unregister(process)
+
+
+class GovernedFFmpegPCMAudio(_GovernedFFmpegAudio, FFmpegPCMAudio):
+    pass
+
+
+class GovernedFFmpegOpusAudio(_GovernedFFmpegAudio, FFmpegOpusAudio):
+    pass
@@ -1,45 +1,243 @@
+import asyncio
 import logging
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass
 from enum import StrEnum
+from functools import partial
 
-from discord import Colour, Embed, Member, Message, Reaction, User
+from discord import Colour, Embed, File, HTTPException, Interaction, Message, ui
+from discord.abc import Messageable
 from discord.ext.commands import Context
 
 from core.logging import logger
 from core.models import TrackInfo
+from core.tracing import Span, get_current_span, record_span
+
+SHOW_QUEUE_EDIT_INTERVAL = 1.0
+SHOW_QUEUE_VIEW_TIMEOUT = 600
+OUTBOX_MERGE_WINDOW = 0.5
+MAX_EMBEDS_PER_MESSAGE = 10
+LEVEL_COLOURS = {
+    logging.INFO: Colour.blue(),
+    logging.WARNING: Colour.orange(),
+    logging.ERROR: Colour.red(),
+}
 
 
 class EmojiStrings(StrEnum):
+    double_arrow_up_small = "⏫"
     arrow_up_small = "⬆️"
+    record_button = "⏺️"
     arrow_down_small = "🔽"
-    double_arrow_up_small = "⏫"
     double_arrow_down_small = "⏬"
-    record_button = "⏺️"
+
+
+class ShowQueueView(ui.View):
+    def __init__(self, on_page_change: Callable[[EmojiStrings, Interaction], Awaitable[None]]) -> None:
+        super().__init__(timeout=SHOW_QUEUE_VIEW_TIMEOUT)
+        self._on_page_change = on_page_change
+        self.message: Message | None = None
+
+        for emoji in EmojiStrings:
+            button: ui.Button = ui.Button(emoji=emoji.value)
+            button.callback = partial(self._on_button_click, emoji)  # type: ignore[method-assign]
+            self.add_item(button)
+
+    async def _on_button_click(self, emoji: EmojiStrings, interaction: Interaction) -> None:
+        # Acknowledge at once, the message itself is edited by the coalesced updater
+        await interaction.response.defer()
+        await self._on_page_change(emoji, interaction)
+
+    async def on_timeout(self) -> None:
+        # Expired buttons don't work anymore, so they shouldn't look like they do
+        for item in self.children:
+            if isinstance(item, ui.Button):
+                item.disabled = True
+
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except HTTPException:
+                logger.exception("Can't disable queue buttons")
+
+
+@dataclass
+class OutgoingMessage:
+    text: str
+    level: int
+    queued_at: float
+    span: Span | None = None
+
+
+@dataclass
+class OutboxStats:
+    depth: int = 0
+    sent_messages: int = 0
+    sent_batches: int = 0
+    last_delay: float = 0.0
+    max_delay: float = 0.0
+    total_delay: float = 0.0
+
+
+class ChannelOutbox:
+    """Outgoing messages of one channel, closely spaced info messages are merged into one embed."""
+
+    def __init__(self, channel: Messageable) -> None:
+        self._channel = channel
+        self._messages: list[OutgoingMessage] = []
+        self._urgent = asyncio.Event()
+        # Set while someone waits for the outbox to be empty, nothing is held back for merging then
+        self._flushing = False
+        self._flush_task: asyncio.Task | None = None
+        self.stats = OutboxStats()
+
+    def put(self, message: OutgoingMessage) -> None:
+        self._messages.append(message)
+        self.stats.depth = len(self._messages)
+
+        if message.level >= logging.ERROR:
+            self._urgent.set()
+
+        if self._flush_task is None or self._flush_task.done():
+            # Nothing is being sent, so there is nothing to merge with and a lone message goes out right away.
+            # Messages which come while it's sent wait for the merge window.
+            self._urgent.set()
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def flush(self) -> None:
+        """Send queued messages without waiting for the merge window and wait until they are sent."""
+        if self._flush_task is None or self._flush_task.done():
+            return
+
+        self._flushing = True
+        self._urgent.set()
+
+        try:
+            await asyncio.shield(self._flush_task)
+        finally:
+            self._flushing = False
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while self._messages:
+            if not self._urgent.is_set():
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self._urgent.wait(), OUTBOX_MERGE_WINDOW)
+
+            if not self._flushing:
+                self._urgent.clear()
+
+            messages, self._messages = self._messages, []
+            self.stats.depth = 0
+
+            embeds = self._build_embeds(messages)
+            for i in range(0, len(embeds), MAX_EMBEDS_PER_MESSAGE):
+                try:
+                    await self._channel.send(embeds=embeds[i : i + MAX_EMBEDS_PER_MESSAGE])
+                except HTTPException:
+                    logger.exception("Can't send messages to the channel")
+
+            sent_at = loop.time()
+            for message in messages:
+                delay = sent_at - message.queued_at
+                # Delivery happens in the outbox task, so it's linked to the request which queued the message
+                record_span("message.send", message.span, delay, batch=len(messages))
+                self.stats.last_delay = delay
+                self.stats.max_delay = max(self.stats.max_delay, delay)
+                self.stats.total_delay += delay
+
+            self.stats.sent_messages += len(messages)
+            self.stats.sent_batches += 1
+
+    @staticmethod
+    def _cut_embed_title(text: str) -> str:
+        return text if len(text) <= 256 else f"{text[:253]}..."
+
+    def _build_embeds(self, messages: list[OutgoingMessage]) -> list[Embed]:
+        # Errors and warnings go first and keep their own embeds, info messages are merged
+        important = sorted((i for i in messages if i.level > logging.INFO), key=lambda i: -i.level)
+        infos = [i for i in messages if i.level <= logging.INFO]
+        embeds = [
+            Embed(title=self._cut_embed_title(i.text), colour=LEVEL_COLOURS.get(i.level, Colour.blue()))
+            for i in important
+        ]
+
+        if len(infos) == 1:
+            embeds.append(Embed(title=self._cut_embed_title(infos[0].text), colour=Colour.blue()))
+        elif infos:
+            description = "\n".join(i.text for i in infos)
+            if len(description) > 4096:
+                description = f"{description[:4093]}..."
+
+            embeds.append(Embed(description=description, colour=Colour.blue()))
+
+        return embeds
 
 
 class MessageService:
     def __init__(self) -> None:
+        self._show_queue_edit_task: asyncio.Task | None = None
+        self._outboxes: dict[int, ChannelOutbox] = {}
         self.reset()
 
     def reset(self) -> None:
+        if self._show_queue_edit_task is not None:
+            self._show_queue_edit_task.cancel()
+
         self._show_queue_message: Message | None = None
         self._show_queue_first_index = 0
         self._show_queue_length = 8
+        # Track lines of the shown page, they change only with the queue or the page
+        self._show_queue_page: tuple[tuple[int, int], list[TrackInfo]] | None = None
+        self._show_queue_render: Callable[[], Embed] | None = None
+        self._show_queue_edit_task = None
+        self._show_queue_last_edit_time = 0.0
 
     async def send(self, ctx: Context, message: str, level: int = logging.INFO) -> None:
-        embed = Embed(title=message if len(message) <= 256 else f"{message[:253]}...")
         if level == logging.INFO:
             logger.info(message)
-            embed.colour = Colour.blue()
         elif level == logging.WARNING:
             logger.warning(message)
-            embed.colour = Colour.orange()
         elif level == logging.ERROR:
             logger.exception(message)
-            embed.colour = Colour.red()
 
-        await ctx.send(embed=embed)
+        if (outbox := self._outboxes.get(ctx.channel.id)) is None:
+            outbox = self._outboxes[ctx.channel.id] = ChannelOutbox(ctx.channel)
+
+        outbox.put(
+            OutgoingMessage(
+                text=message,
+                level=level,
+                queued_at=asyncio.get_running_loop().time(),
+                span=get_current_span(),
+            )
+        )
+
+    async def send_files(self, ctx: Context, content: str, files: list[File]) -> None:
+        # Queued messages go first, so the channel reads in the order things happened
+        await self._flush_outbox(ctx)
+        await ctx.send(content=content, files=files)
+
+    async def flush(self) -> None:
+        """Send everything that is queued, the outbox task may not get the chance otherwise, e.g. before exit."""
+        await asyncio.gather(*(outbox.flush() for outbox in self._outboxes.values()))
 
-    async def send_show_queue(self, ctx: Context, tracks: list[TrackInfo], queue_length: int) -> None:
+    async def close(self) -> None:
+        await self.flush()
+        self.reset()
+
+    def get_outbox_stats(self) -> dict[int, OutboxStats]:
+        return {channel_id: outbox.stats for channel_id, outbox in self._outboxes.items()}
+
+    async def send_show_queue(
+        self,
+        ctx: Context,
+        tracks: list[TrackInfo],
+        queue_length: int,
+        on_page_change: Callable[[EmojiStrings, Interaction], Awaitable[None]],
+    ) -> None:
         self._show_queue_first_index = 0
 
         for track in tracks:
@@ -47,39 +245,31 @@ class MessageService:
                 self._show_queue_first_index = track.queue_index
                 break
 
-        embed = await self._get_show_queue_embed(tracks, queue_length)
-        message = self._show_queue_message = await ctx.send(embed=embed)
+        embed = self._build_show_queue_embed(tracks, queue_length)
+        await self._flush_outbox(ctx)
 
         if self._show_queue_first_index > 0 or len(tracks) > self._show_queue_length:
-            await message.add_reaction(EmojiStrings.arrow_up_small)
-            await message.add_reaction(EmojiStrings.arrow_down_small)
-            await message.add_reaction(EmojiStrings.record_button)
-            await message.add_reaction(EmojiStrings.double_arrow_up_small)
-            await message.add_reaction(EmojiStrings.double_arrow_down_small)
+            view = ShowQueueView(on_page_change)
+            self._show_queue_message = view.message = await ctx.send(embed=embed, view=view)
+        else:
+            self._show_queue_message = await ctx.send(embed=embed)
 
     def get_show_queue_offset_and_limit(self) -> tuple[int, int]:
         return self._show_queue_first_index, self._show_queue_length
 
-    def is_reaction_on_show_queue_message(self, reaction: Reaction) -> bool:
-        if not (self._show_queue_message and reaction.message.id == self._show_queue_message.id):
-            return False
-
-        return str(reaction.emoji) in (
-            EmojiStrings.arrow_up_small,
-            EmojiStrings.arrow_down_small,
-            EmojiStrings.record_button,
-            EmojiStrings.double_arrow_up_small,
-            EmojiStrings.double_arrow_down_small,
+    def is_interaction_on_show_queue_message(self, interaction: Interaction) -> bool:
+        return bool(
+            self._show_queue_message
+            and interaction.message is not None
+            and interaction.message.id == self._show_queue_message.id
         )
 
-    def on_show_queue_message_reaction_add(
+    def on_show_queue_page_change(
         self,
-        reaction: Reaction,
+        emoji: EmojiStrings,
         queue_length: int,
         current_index: int,
     ) -> None:
-        emoji = str(reaction.emoji)
-
         if emoji == EmojiStrings.arrow_down_small:
             self._show_queue_first_index += self._show_queue_length
             self._show_queue_first_index = min(self._show_queue_first_index, queue_length - self._show_queue_length)
@@ -93,21 +283,58 @@ class MessageService:
         else:
             self._show_queue_first_index = current_index
 
-    async def update_show_queue(
+    def get_show_queue_embed(
         self,
-        reaction: Reaction,
-        tracks: list[TrackInfo],
+        queue_version: int,
         queue_length: int,
-        user: Member | User,
-    ) -> None:
-        if self._show_queue_message is not None:
-            embed = await self._get_show_queue_embed(tracks, queue_length)
-            await self._show_queue_message.edit(embed=embed)
+        get_tracks: Callable[[], list[TrackInfo]],
+        refresh_track: Callable[[TrackInfo], None],
+    ) -> Embed:
+        key = (queue_version, self._show_queue_first_index)
+
+        if self._show_queue_page is None or self._show_queue_page[0] != key:
+            self._show_queue_page = key, get_tracks()
+        else:
+            # Played time and download state change without any queue change
+            for track_info in self._show_queue_page[1]:
+                refresh_track(track_info)
+
+        return self._build_show_queue_embed(self._show_queue_page[1], queue_length)
+
+    def request_show_queue_update(self, render: Callable[[], Embed]) -> None:
+        """Schedule an edit of the queue message, bursts of requests are merged into one edit per interval."""
+        if self._show_queue_message is None:
+            return
+
+        self._show_queue_render = render
+
+        if self._show_queue_edit_task is None or self._show_queue_edit_task.done():
+            self._show_queue_edit_task = asyncio.create_task(self._edit_show_queue(self._show_queue_message))
+
+    async def _flush_outbox(self, ctx: Context) -> None:
+        if (outbox := self._outboxes.get(ctx.channel.id)) is not None:
+            await outbox.flush()
+
+    async def _edit_show_queue(self, message: Message) -> None:
+        loop = asyncio.get_running_loop()
+
+        while self._show_queue_render is not None and self._show_queue_message is message:
+            delay = self._show_queue_last_edit_time + SHOW_QUEUE_EDIT_INTERVAL - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            render, self._show_queue_render = self._show_queue_render, None
+            if render is None:
+                break
+
+            self._show_queue_last_edit_time = loop.time()
 
-        message: Message = reaction.message
-        await message.remove_reaction(reaction, user)
+            try:
+                await message.edit(embed=render())
+            except HTTPException:
+                logger.exception("Can't update queue message")
 
-    async def _get_show_queue_embed(self, tracks: list[TrackInfo], queue_length: int) -> Embed:
+    def _build_show_queue_embed(self, tracks: list[TrackInfo], queue_length: int) -> Embed:
         embed = Embed(title=f"Queue of {queue_length} tracks")
 
         for track in tracks:
@@ -1,30 +1,38 @@
 import asyncio
 import logging
 from collections.abc import Callable
+from contextlib import suppress
 from datetime import timedelta
 
 from discord import (
     Activity,
     ActivityType,
-    Member,
-    Reaction,
-    Status,
-    User,
+    ClientException,
+    Embed,
+    Interaction,
     VoiceClient,
 )
 from discord.ext.commands import Context
 
 from config.settings import Settings
-from core.exceptions import CantDownloadError, CantLoadTrackInfoError
+from core.exceptions import CantDownloadError, CantLoadTrackInfoError, FFmpegOverloadError
 from core.logging import logger
+from core.metrics import VOICE_RECONNECTS
 from core.models import Track, TrackInfo
+from core.tracing import trace
 from services.download import DownloadService
-from services.message import MessageService
+from services.download_pool import download_session
+from services.message import EmojiStrings, MessageService
+from services.play_history import PlayHistory
 from services.player import Player, PlayerStatus
+from services.presence import PresenceManager
 from services.queue import QueueManager
 
 # TODO(@<zviger>): Fix it  # noqa: FIX002, TD003
 SLEEP_TIME = 0.25
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 0.5
+VOICE_CONNECT_TIMEOUT = 10
 
 
 class MusicService:
@@ -35,6 +43,8 @@ class MusicService:
         player: Player,
         download_service: DownloadService,
         message_service: MessageService,
+        presence_manager: PresenceManager,
+        play_history: PlayHistory,
         settings: Settings,
     ) -> None:
         self._queue_manager = queue_manager
@@ -43,6 +53,22 @@ class MusicService:
         self._voice_client = voice_client
         self._download_service = download_service
         self._message_service = message_service
+        self._presence_manager = presence_manager
+        self._play_history = play_history
+        self._dropped_track: Track | None = None
+        self._voice_recovery_task: asyncio.Task | None = None
+        # Our own disconnects of reconnect look the same as being disconnected by someone else
+        self._is_reconnecting = False
+        self._is_kicked = False
+
+    def get_guild_id(self) -> int:
+        return self._voice_client.guild.id
+
+    def get_queue_length(self) -> int:
+        return self._queue_manager.get_queue_length()
+
+    def is_playing(self) -> bool:
+        return self._player.is_in_any_status(PlayerStatus.PLAYING)
 
     async def add_to_playlist(
         self,
@@ -75,11 +101,7 @@ class MusicService:
             if not self._player.is_in_any_status(PlayerStatus.PLAYING):
                 track = self._queue_manager.get_next()
                 if track is not None:
-                    await self._player.try_play(
-                        track=track,
-                        on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                        on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-                    )
+                    await self._try_play(ctx, track)
 
     async def im_play(
         self,
@@ -94,26 +116,72 @@ class MusicService:
             if self._player.is_in_any_status(PlayerStatus.PLAYING):
                 current_track = self._queue_manager.get_current()
                 if current_track is not None:
+                    # Used when the suspended source can't be resumed, e.g. bass is changed in the meantime
                     current_time, _ = self._player.get_played_and_full_time(current_track)
                     current_track.start_time = current_time
 
-                self._player.stop()
+                # An interrupting track is replaced, only the queue track is resumed
+                if self._queue_manager.get_interrupting() is None:
+                    self._player.suspend()
+                else:
+                    self._player.stop()
+
                 await asyncio.sleep(SLEEP_TIME)
 
             self._queue_manager.add_interruption(track)
-            await self._player.try_play(
-                track=track,
-                on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-            )
+            await self._try_play(ctx, track)
         elif self._player.is_in_any_status(PlayerStatus.PAUSED):
             await self._message_service.send(ctx, "Music shouldn't be paused!", logging.ERROR)
 
+    async def reconnect(self, ctx: Context) -> None:
+        """Move to a new voice client, a disconnected one can't connect again, and resume the dropped track."""
+        channel = self._voice_client.channel
+        self._is_reconnecting = True
+
+        try:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._voice_client.disconnect(force=True), VOICE_CONNECT_TIMEOUT)
+            # Discord may not confirm the disconnect of a dropped connection, the client is forgotten anyway
+            self._voice_client.cleanup()
+            voice_client: VoiceClient = await channel.connect(
+                timeout=VOICE_CONNECT_TIMEOUT,
+                reconnect=True,
+                self_deaf=True,
+            )
+        finally:
+            self._is_reconnecting = False
+
+        self._is_kicked = False
+        self._voice_client = voice_client
+        self._player.set_voice_client(voice_client)
+
+        if (track := self._dropped_track) is not None:
+            self._dropped_track = None
+            await self._try_play(ctx, track, is_replay=True)
+
+    def on_voice_kicked(self) -> None:
+        """Someone, e.g. a moderator, has disconnected the bot from the voice channel, it shouldn't come back."""
+        if self._is_reconnecting:
+            return
+
+        self._is_kicked = True
+        self._dropped_track = None
+
+        if self._voice_recovery_task is not None:
+            self._voice_recovery_task.cancel()
+            self._voice_recovery_task = None
+
     async def stop(self, ctx: Context) -> None:
+        if self._voice_recovery_task is not None:
+            self._voice_recovery_task.cancel()
+            self._voice_recovery_task = None
+
+        self._dropped_track = None
         self._player.stop()
+        self._player.discard_suspended()
         self._queue_manager.clear()
         self._message_service.reset()
-        await self._set_chill_activity()
+        self._set_chill_activity()
         await self._message_service.send(ctx, "Player is stopped!")
 
     async def pause(self, ctx: Context) -> None:
@@ -138,11 +206,7 @@ class MusicService:
         if track := self._queue_manager.try_get_next():
             self._player.stop()
             await asyncio.sleep(SLEEP_TIME)
-            await self._player.try_play(
-                track=track,
-                on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-            )
+            await self._try_play(ctx, track)
         else:
             await self._message_service.send(ctx, "Can't play next music: end of queue", logging.WARNING)
 
@@ -150,11 +214,7 @@ class MusicService:
         if track := self._queue_manager.try_get_prev():
             self._player.stop()
             await asyncio.sleep(SLEEP_TIME)
-            await self._player.try_play(
-                track=track,
-                on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-            )
+            await self._try_play(ctx, track)
         else:
             await self._message_service.send(ctx, "Can't play prev music: end of queue", logging.WARNING)
 
@@ -162,11 +222,7 @@ class MusicService:
         if track := self._queue_manager.jump_to(index):
             self._player.stop()
             await asyncio.sleep(SLEEP_TIME)
-            await self._player.try_play(
-                track=track,
-                on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-            )
+            await self._try_play(ctx, track)
         else:
             await self._message_service.send(ctx, "Invalid index value", logging.ERROR)
 
@@ -182,13 +238,9 @@ class MusicService:
         if current_track == removed:
             self._player.stop()
             if track := self._queue_manager.get_next():
-                await self._player.try_play(
-                    track=track,
-                    on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                    on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-                )
+                await self._try_play(ctx, track)
             else:
-                await self._set_chill_activity()
+                self._set_chill_activity()
 
         await self._message_service.send(ctx, f"Track number - {index + 1} is removed!")
 
@@ -223,16 +275,12 @@ class MusicService:
             self._player.stop()
             await asyncio.sleep(SLEEP_TIME)
             track.start_time = current_time
-            await self._player.try_play(
-                track=track,
-                on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track, notify=False),
-                on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-            )
+            await self._try_play(ctx, track, is_replay=True)
 
         if self._player.is_in_any_status(PlayerStatus.PAUSED):
             self._player.pause()
 
-        self._settings.dump_config()
+        self._settings.schedule_dump_config()
 
     async def loop(self, ctx: Context) -> None:
         is_looped = self._queue_manager.toggle_loop()
@@ -247,22 +295,25 @@ class MusicService:
             ctx,
             self._get_track_infos_for_show_queue(),
             self._queue_manager.get_queue_length(),
+            on_page_change=self._on_show_queue_page_change,
         )
 
-    async def on_message_reaction_add(self, reaction: Reaction, user: Member | User) -> None:
-        if self._message_service.is_reaction_on_show_queue_message(reaction):
-            self._message_service.on_show_queue_message_reaction_add(
-                reaction,
+    async def _on_show_queue_page_change(self, emoji: EmojiStrings, interaction: Interaction) -> None:
+        if self._message_service.is_interaction_on_show_queue_message(interaction):
+            self._message_service.on_show_queue_page_change(
+                emoji,
                 self._queue_manager.get_queue_length(),
                 self._queue_manager.get_current_index(),
             )
+            self._message_service.request_show_queue_update(self._render_show_queue)
 
-            await self._message_service.update_show_queue(
-                reaction,
-                self._get_track_infos_for_show_queue(),
-                self._queue_manager.get_queue_length(),
-                user,
-            )
+    def _render_show_queue(self) -> Embed:
+        return self._message_service.get_show_queue_embed(
+            self._queue_manager.get_version(),
+            self._queue_manager.get_queue_length(),
+            self._get_track_infos_for_show_queue,
+            self._refresh_track_info,
+        )
 
     def _get_track_infos_for_show_queue(self) -> list[TrackInfo]:
         offset, limit = self._message_service.get_show_queue_offset_and_limit()
@@ -285,6 +336,7 @@ class MusicService:
                 is_interrupting=interrupting_track == track,
                 title=track.title,
                 download_done=bool(not track.download_task or track.download_task.done()),
+                track=track,
             )
 
             if interrupting_track != track:
@@ -295,10 +347,14 @@ class MusicService:
 
         return track_infos
 
-    async def _set_chill_activity(self) -> None:
-        await self._voice_client.client.change_presence(
-            status=Status.online,
-            activity=Activity(
+    def _refresh_track_info(self, track_info: TrackInfo) -> None:
+        track = track_info.track
+        track_info.played_time, track_info.full_time = self._player.get_played_and_full_time(track)
+        track_info.download_done = bool(not track.download_task or track.download_task.done())
+
+    def _set_chill_activity(self) -> None:
+        self._presence_manager.update(
+            Activity(
                 name="Не могу стоять пока другие работают... пойду полежу",
                 type=ActivityType.watching,
             ),
@@ -314,11 +370,15 @@ class MusicService:
         force_load_first: bool = False,
     ) -> list[Track]:
         try:
-            tracks = await self._download_service.download(
-                source=source,
-                only_one=is_im_track,
-                force_load_first=force_load_first,
-            )
+            with (
+                trace("music_service.download", source=source),
+                download_session(str(self.get_guild_id())),
+            ):
+                tracks = await self._download_service.download(
+                    source=source,
+                    only_one=is_im_track,
+                    force_load_first=force_load_first,
+                )
         except (CantDownloadError, CantLoadTrackInfoError) as e:
             await self._message_service.send(ctx, str(e), logging.ERROR)
         except (RuntimeError, OSError, ValueError, KeyError) as e:
@@ -336,31 +396,89 @@ class MusicService:
 
         return []
 
+    async def _try_play(self, ctx: Context, track: Track, *, is_replay: bool = False) -> None:
+        # A replay restarts ffmpeg for the track which is already playing, e.g. after a volume change or a voice
+        # reconnect, so it's neither announced nor counted as a play
+        try:
+            with trace("music_service.play", track=track.id):
+                await self._player.try_play(
+                    track=track,
+                    on_success_play_callback=self._on_success_play_callback_factory(
+                        ctx=ctx,
+                        track=track,
+                        is_replay=is_replay,
+                    ),
+                    on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx, track=track),
+                    # The suspended track is resumed after the interrupting one
+                    keep_suspended=track is self._queue_manager.get_interrupting(),
+                )
+        except FFmpegOverloadError as e:
+            await self._message_service.send(ctx, str(e), logging.WARNING)
+        except CantDownloadError as e:
+            # Queued tracks are downloaded in background and fail only when they are awaited
+            await self._message_service.send(ctx, str(e), logging.ERROR)
+
     def _on_music_end_callback_factory(
         self,
         ctx: Context,
+        track: Track,
     ) -> Callable:
         def callback(error: Exception | None) -> None:
             if error:
                 logger.error(error)
             elif self._player.is_in_any_status(PlayerStatus.PLAYING, PlayerStatus.PAUSED):
+                if not self._voice_client.is_connected():
+                    if self._is_kicked:
+                        # Disconnected on purpose, so the playback is over
+                        self._player.stop()
+                        self._voice_client.loop.call_soon_threadsafe(self._set_chill_activity)
+                    else:
+                        # The track isn't over, discord.py has given up the voice connection and stopped the player
+                        track.start_time = self._player.get_position(track)
+                        self._dropped_track = track
+                        self._player.stop()
+                        self._voice_client.loop.call_soon_threadsafe(self._start_voice_recovery, ctx)
+
+                    return
+
                 self._player.stop()
-                if track := self._queue_manager.get_next():
-                    self._voice_client.loop.create_task(
-                        self._player.try_play(
-                            track=track,
-                            on_success_play_callback=self._on_success_play_callback_factory(ctx=ctx, track=track),
-                            on_music_end_callback=self._on_music_end_callback_factory(ctx=ctx),
-                        )
-                    )
+                if next_track := self._queue_manager.get_next():
+                    self._voice_client.loop.create_task(self._try_play(ctx, next_track))
                 else:
-                    self._voice_client.loop.create_task(self._set_chill_activity())
+                    self._voice_client.loop.call_soon_threadsafe(self._set_chill_activity)
 
         return callback
 
-    def _on_success_play_callback_factory(self, ctx: Context, track: Track, *, notify: bool = True) -> Callable:
-        async def callback() -> None:
-            if notify:
+    def _start_voice_recovery(self, ctx: Context) -> None:
+        if self._voice_recovery_task is None or self._voice_recovery_task.done():
+            self._voice_recovery_task = asyncio.create_task(self._recover_voice(ctx))
+
+    async def _recover_voice(self, ctx: Context) -> None:
+        with trace("music_service.voice_recovery"):
+            for attempt in range(RECONNECT_ATTEMPTS):
+                if attempt:
+                    await asyncio.sleep(RECONNECT_DELAY * 2 ** (attempt - 1))
+
+                try:
+                    await self.reconnect(ctx)
+                except (TimeoutError, ClientException) as e:
+                    logger.warning("Voice reconnect attempt %s failed: %s", attempt + 1, e)
+                except Exception:  # noqa: BLE001
+                    # Not a connection problem, another attempt would fail the same way
+                    logger.exception("Voice recovery failed")
+                    break
+                else:
+                    VOICE_RECONNECTS.inc("success")
+                    logger.info("Voice connection is restored")
+
+                    return
+
+        VOICE_RECONNECTS.inc("error")
+        await self._message_service.send(ctx, "Voice connection is lost, summon me again", logging.ERROR)
+
+    def _on_success_play_callback_factory(self, ctx: Context, track: Track, *, is_replay: bool = False) -> Callable:
+        async def callback(*, is_resumed: bool = False) -> None:
+            if not is_replay:
                 time_str = (
                     "STREAM" if track.stream_link else f"{track.start_time} - {timedelta(seconds=track.duration)}"
                 )
@@ -368,9 +486,10 @@ class MusicService:
                     ctx,
                     f"Now is playing - {track.title} [{time_str}]\nLink - {track.link}",
                 )
-            await self._voice_client.client.change_presence(
-                status=Status.online,
-                activity=Activity(name=track.title, type=ActivityType.listening),
-            )
+            self._presence_manager.update(Activity(name=track.title, type=ActivityType.listening))
+
+            # A resumed track was counted when it started, before the interruption
+            if not is_replay and not is_resumed:
+                await self._play_history.record(self.get_guild_id(), track)
 
         return callback
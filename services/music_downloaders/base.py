@@ -11,5 +11,6 @@ class MusicDownloader(ABC):
         *,
         only_one: bool = True,
         force_load_first: bool = False,
+        urgent: bool = True,
     ) -> list[Track]:
         pass
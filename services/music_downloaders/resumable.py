@@ -0,0 +1,73 @@
+import asyncio
+from pathlib import Path
+
+import aiohttp
+
+from core.exceptions import CantDownloadError
+from core.logging import logger
+from core.metrics import RESUMED_BYTES
+
+PART_SUFFIX = ".part"
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_ATTEMPTS = 3
+RETRY_DELAY = 2.0
+READ_TIMEOUT = 60
+
+
+def get_part_path(file_path: Path) -> Path:
+    return file_path.with_name(f"{file_path.name}{PART_SUFFIX}")
+
+
+async def download_resumable(url: str, file_path: Path, *, provider: str) -> None:
+    """Download into a .part file which is renamed when it's complete.
+
+    A download which was interrupted, even by a restart, continues from the size of its .part file with a Range
+    request. The file is downloaded again only if the server doesn't support ranges.
+    """
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            await _download(url, file_path, provider=provider)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            if attempt == DOWNLOAD_ATTEMPTS:
+                msg = f"Can't download {file_path.name}"
+                raise CantDownloadError(msg) from e
+
+            logger.warning("Download of %s is interrupted, resuming: %s", file_path.name, e)
+            await asyncio.sleep(RETRY_DELAY * attempt)
+        else:
+            return
+
+
+async def _download(url: str, file_path: Path, *, provider: str) -> None:
+    part_path = get_part_path(file_path)
+    resume_from = part_path.stat().st_size if part_path.exists() else 0
+    headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=READ_TIMEOUT)
+
+    async with aiohttp.ClientSession(timeout=timeout) as session, session.get(url, headers=headers) as response:
+        if response.status == 416:
+            # The part is already complete, only the rename didn't happen
+            if response.headers.get("Content-Range") == f"bytes */{resume_from}":
+                part_path.replace(file_path)
+
+                return
+
+            # The file has changed on the server, the next attempt starts from scratch
+            part_path.unlink()
+
+        response.raise_for_status()
+        is_resumed = response.status == 206 and response.headers.get("Content-Range", "").startswith(
+            f"bytes {resume_from}-"
+        )
+
+        if is_resumed:
+            RESUMED_BYTES.inc(provider, amount=resume_from)
+            logger.info("Resume %s from %s bytes", file_path.name, resume_from)
+        elif resume_from:
+            logger.info("Server doesn't support ranges, download %s from the start", file_path.name)
+
+        with part_path.open("ab" if is_resumed else "wb") as part_file:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                await asyncio.to_thread(part_file.write, chunk)
+
+    part_path.replace(file_path)
@@ -1,6 +1,6 @@
-import asyncio
 import itertools
 import uuid
+from functools import partial
 from pathlib import Path
 from urllib import parse
 
@@ -8,18 +8,36 @@ import yandex_music
 from yandex_music.utils.request_async import Request
 
 from core.exceptions import CantDownloadError
+from core.metrics import CACHE_REQUESTS, METADATA_LATENCY
 from core.models import Track
+from core.tracing import trace
+from services.download_pool import DownloadPool
 from services.music_downloaders.base import MusicDownloader
+from services.music_downloaders.resumable import download_resumable
+from services.transcoder import Transcoder, get_cached_file
 
 
 class YandexMusicDownloader(MusicDownloader):
     FILE_EXTENSION = ".mp3"
+    CODEC = "mp3"
+    BITRATE = 192
 
-    def __init__(self, token: str, cache_dir: Path) -> None:
+    def __init__(
+        self,
+        token: str,
+        cache_dir: Path,
+        download_pool: DownloadPool,
+        transcoder: Transcoder | None = None,
+    ) -> None:
         self._request = Request(timeout=1000)
         self._client = yandex_music.ClientAsync(token=token, request=self._request)
         self._request.set_and_return_client(self._client)
         self._cache_dir = cache_dir
+        self._download_pool = download_pool
+        self._transcoder = transcoder
+
+    async def warm_up(self) -> None:
+        await self._client.init()
 
     async def download(
         self,
@@ -27,11 +45,29 @@ class YandexMusicDownloader(MusicDownloader):
         *,
         only_one: bool = True,
         force_load_first: bool = False,
+        urgent: bool = True,
     ) -> list[Track]:
+        tracks = []
+
+        with METADATA_LATENCY.time("yandex_music"), trace("yandex_music.metadata", source=source):
+            ym_tracks = await self._get_ym_tracks(source)
+
+        if len(ym_tracks) > 1 and only_one:
+            ym_tracks = [ym_tracks[0]]
+
+        for i, ym_track in enumerate(ym_tracks):
+            if not ym_track.available:
+                continue
+
+            track = await self._download(ym_track, force_load=force_load_first and i == 0, urgent=urgent)
+            tracks.append(track)
+
+        return tracks
+
+    async def _get_ym_tracks(self, source: str) -> list[yandex_music.Track]:
         parsed_url = parse.urlparse(source)
         path_args = parsed_url.path.strip("/").split("/")
-        tracks = []
-        ym_tracks = []
+        ym_tracks: list[yandex_music.Track] = []
 
         if len(path_args) == 2 and path_args[0] == "album" and path_args[1].isnumeric():
             album = await self._client.albums_with_tracks(int(path_args[1]))
@@ -58,24 +94,20 @@ class YandexMusicDownloader(MusicDownloader):
             msg = "Cant download yandex music"
             raise CantDownloadError(msg)
 
-        if len(ym_tracks) > 1 and only_one:
-            ym_tracks = [ym_tracks[0]]
-
-        for i, ym_track in enumerate(ym_tracks):
-            if not ym_track.available:
-                continue
+        return ym_tracks
 
-            track = await self._download(ym_track, force_load=force_load_first and i == 0)
-            tracks.append(track)
-
-        return tracks
-
-    async def _download(self, track: yandex_music.Track, *, force_load: bool) -> Track:
+    async def _download(self, track: yandex_music.Track, *, force_load: bool, urgent: bool) -> Track:
         download_task = None
-        filepath = self._cache_dir.joinpath(f"{track.track_id}{self.FILE_EXTENSION}")
+        filepath = get_cached_file(self._cache_dir, track.track_id, self.FILE_EXTENSION)
 
-        if not filepath.exists():
-            download_task = asyncio.create_task(track.download_async(str(filepath)))
+        if filepath.exists():
+            CACHE_REQUESTS.inc("yandex_music", "hit")
+        else:
+            CACHE_REQUESTS.inc("yandex_music", "miss")
+            download_task = self._download_pool.submit(
+                partial(self._download_file, track, filepath),
+                urgent=force_load and urgent,
+            )
             if force_load:
                 await download_task
 
@@ -88,5 +120,17 @@ class YandexMusicDownloader(MusicDownloader):
             duration=track.duration_ms // 1000 if track.duration_ms is not None else 0,
             uuid=uuid.uuid4(),
             download_task=download_task,
-            file_extension=self.FILE_EXTENSION,
+            file_extension=filepath.suffix,
         )
+
+    async def _download_file(self, track: yandex_music.Track, file_path: Path) -> None:
+        with trace("yandex_music.download", track=track.track_id):
+            download_info = await track.get_specific_download_info_async(self.CODEC, self.BITRATE)
+            if download_info is None:
+                msg = "Unavailable bitrate"
+                raise CantDownloadError(msg)
+
+            await download_resumable(await download_info.get_direct_link_async(), file_path, provider="yandex_music")
+
+        if self._transcoder is not None:
+            self._transcoder.schedule(file_path)
@@ -1,28 +1,25 @@
 import asyncio
 import itertools
+import multiprocessing
 import time
 import uuid
-from collections.abc import Callable, Generator, Iterable
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from functools import partial
 from pathlib import Path
-from typing import Any
 
 import yt_dlp as youtube_dl
 
 from core.exceptions import CantDownloadError
 from core.logging import logger
+from core.metrics import CACHE_REQUESTS, METADATA_LATENCY, RESUMED_BYTES
 from core.models import Track
+from core.tracing import trace
+from services.download_pool import DownloadPool
 from services.music_downloaders.base import MusicDownloader
+from services.music_downloaders.resumable import DOWNLOAD_ATTEMPTS, PART_SUFFIX, RETRY_DELAY
 
-
-class Executor:
-    def __init__(self, loop: asyncio.AbstractEventLoop, thread_count: int = 1) -> None:
-        self._ex = ThreadPoolExecutor(max_workers=thread_count)
-        self._loop = loop
-
-    def __call__(self, f: Callable, *args: Any, **kwargs: Any) -> asyncio.Future:  # noqa: ANN401
-        return self._loop.run_in_executor(self._ex, partial(f, *args, **kwargs))
+PLAYLIST_LIMIT = 50
 
 
 class YtLogger:
@@ -49,33 +46,152 @@ class YtLogger:
         logger.error(msg)
 
 
+@dataclass(frozen=True)
+class VideoInfo:
+    """Part of yt-dlp's info dict which is needed to queue a track, small enough to be sent between processes."""
+
+    id: str
+    title: str
+    url: str
+    duration: int
+    is_live: bool = False
+    stream_url: str = ""
+
+
+@dataclass(frozen=True)
+class SourceInfo:
+    extractor: str
+    live_status: str | None
+    is_playlist: bool
+    videos: tuple[VideoInfo, ...]
+
+
+def create_client(cache_dir: Path) -> youtube_dl.YoutubeDL:
+    return youtube_dl.YoutubeDL(
+        params={
+            "format": "bestaudio/best",
+            "outtmpl": f"{cache_dir}/%(id)s.%(ext)s",
+            "skip-unavailable-fragments": True,
+            "youtube-skip-dash-manifest": True,
+            "cache-dir": "~/.cache/youtube-dl",
+            "logger": YtLogger,
+            "default_search": "auto",
+            "quiet": True,
+            "no_warnings": True,
+            "continuedl": True,
+            "postprocessors": [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "opus",
+                    "preferredquality": "192",
+                },
+            ],
+        },
+    )
+
+
+def to_video_info(info: dict) -> VideoInfo:
+    is_live = bool(info.get("is_live"))
+
+    return VideoInfo(
+        id=info["id"],
+        title=(info.get("title") or "").strip(),
+        url=(info.get("webpage_url") or info.get("original_url") or info["url"]).strip(),
+        duration=info.get("duration") or 0,
+        is_live=is_live,
+        stream_url=info.get("url", "") if is_live else "",
+    )
+
+
+def to_source_info(info: dict) -> SourceInfo:
+    entries = info.get("entries")
+
+    return SourceInfo(
+        extractor=info.get("extractor", ""),
+        live_status=info.get("live_status"),
+        is_playlist=entries is not None,
+        # Playlist entries are lazy, only the first PLAYLIST_LIMIT of them are requested
+        videos=tuple(to_video_info(i) for i in itertools.islice(entries, PLAYLIST_LIMIT) if i is not None)
+        if entries is not None
+        else (to_video_info(info),),
+    )
+
+
+def extract_source_info(client: youtube_dl.YoutubeDL, source: str, *, process: bool = True) -> SourceInfo | None:
+    try:
+        info = client.extract_info(source, download=False, process=process)
+    except youtube_dl.utils.DownloadError as e:
+        # yt-dlp errors keep a traceback, which can't be sent back from a worker process
+        raise CantDownloadError(str(e)) from None
+
+    return to_source_info(info) if info is not None else None
+
+
+_worker_client: youtube_dl.YoutubeDL | None = None
+
+
+def init_extraction_worker(cache_dir: Path) -> None:
+    global _worker_client  # noqa: PLW0603
+    _worker_client = create_client(cache_dir)
+
+
+def is_worker_ready() -> bool:
+    return _worker_client is not None
+
+
+def extract_in_worker(source: str, *, process: bool = True) -> SourceInfo | None:
+    if _worker_client is None:
+        msg = "Extraction worker isn't initialized"
+        raise RuntimeError(msg)
+
+    return extract_source_info(_worker_client, source, process=process)
+
+
 class YouTubeDownloader(MusicDownloader):
     FILE_EXTENSION = ".opus"
+    WARM_UP_EXTRACTORS = ("Youtube", "YoutubeTab", "YoutubeSearch")
 
-    def __init__(self, cache_dir: Path) -> None:
-        self._client = youtube_dl.YoutubeDL(
-            params={
-                "format": "bestaudio/best",
-                "outtmpl": f"{cache_dir}/%(id)s.%(ext)s",
-                "skip-unavailable-fragments": True,
-                "youtube-skip-dash-manifest": True,
-                "cache-dir": "~/.cache/youtube-dl",
-                "logger": YtLogger,
-                "default_search": "auto",
-                "quiet": True,
-                "no_warnings": True,
-                "nopart": True,
-                "postprocessors": [
-                    {
-                        "key": "FFmpegExtractAudio",
-                        "preferredcodec": "opus",
-                        "preferredquality": "192",
-                    },
-                ],
-            },
-        )
-        self._download_thread_count = 8
+    def __init__(self, cache_dir: Path, download_pool: DownloadPool, extraction_processes: int = 0) -> None:
+        self._client = create_client(cache_dir)
+        self._download_pool = download_pool
         self._cache_dir = cache_dir
+        self._extraction_processes = extraction_processes
+        self._extraction_pool: ProcessPoolExecutor | None = None
+
+        # Extraction is CPU heavy pure Python, in worker processes it doesn't compete for the GIL
+        # with the audio thread. Only small SourceInfo records travel back.
+        if extraction_processes > 0:
+            self._extraction_pool = ProcessPoolExecutor(
+                max_workers=extraction_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_extraction_worker,
+                initargs=(cache_dir,),
+            )
+
+    def warm_up(self, source: str | None = None) -> None:
+        """Load and initialize the extractors, blocking, so it should be called in a background thread.
+
+        A source is extracted to fill yt-dlp's player cache.
+        """
+        for ie_key in self.WARM_UP_EXTRACTORS:
+            self._client.get_info_extractor(ie_key).initialize()
+
+        # Workers are spawned on demand, one per waiting call, and import yt-dlp on start
+        if self._extraction_pool is not None:
+            futures = [self._extraction_pool.submit(is_worker_ready) for _ in range(self._extraction_processes)]
+            for future in futures:
+                future.result()
+
+        if source:
+            try:
+                self._client.extract_info(source, download=False)
+            except youtube_dl.utils.DownloadError as e:
+                logger.warning("Can't warm up youtube with %s: %s", source, e)
+
+    def close(self) -> None:
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown(wait=False, cancel_futures=True)
+            self._extraction_pool = None
 
     async def download(
         self,
@@ -83,45 +199,42 @@ class YouTubeDownloader(MusicDownloader):
         *,
         only_one: bool = True,
         force_load_first: bool = False,
+        urgent: bool = True,
     ) -> list[Track]:
         tracks = []
+        source_info = await self._extract(source, process=False)
 
-        try:
-            source_info = self._client.extract_info(source, download=False, process=False)
-        except youtube_dl.utils.DownloadError as e:
-            raise CantDownloadError from e
-
-        if (
-            source_info is not None
-            and "youtu" in source_info["extractor"]
-            and source_info.get("live_status") != "is_live"
-        ):
-            if entries := source_info.get("entries"):
-                entries = list(itertools.islice(entries, 50))
+        if source_info is not None and "youtu" in source_info.extractor and source_info.live_status != "is_live":
+            if source_info.is_playlist:
+                videos = list(source_info.videos)
 
                 if only_one:
-                    entries = [entries[0]]
+                    videos = videos[:1]
 
-                tracks.extend(await self._batch_download(source_infos=entries, force_load_first=force_load_first))
+                tracks.extend(
+                    await self._batch_download(videos=videos, force_load_first=force_load_first, urgent=urgent),
+                )
             else:
-                tracks.append(await self._download(source_info))
+                tracks.append(await self._download(source_info.videos[0], urgent=urgent))
         else:
-            source_info = self._client.extract_info(source, download=False)
+            source_info = await self._extract(source)
 
-            if source_info is not None:
-                if source_info.get("is_live"):
+            if source_info is not None and source_info.videos:
+                video = source_info.videos[0]
+
+                if video.is_live:
                     tracks.append(
                         Track(
-                            id=source_info["id"],
-                            title=source_info["title"].strip(),
-                            link=source_info["original_url"].strip(),
+                            id=video.id,
+                            title=video.title,
+                            link=video.url,
                             duration=0,
-                            stream_link=source_info["url"],
+                            stream_link=video.stream_url,
                             uuid=uuid.uuid4(),
                         ),
                     )
                 else:
-                    tracks.append(await self._download(source_info["entries"][0]))
+                    tracks.append(await self._download(video, urgent=urgent))
 
         if not tracks:
             msg = "Can't download music by this source"
@@ -134,93 +247,104 @@ class YouTubeDownloader(MusicDownloader):
         track_names: list[str],
         *,
         force_load_first: bool = False,
+        urgent: bool = True,
     ) -> list[Track]:
-        source_infos = []
+        videos = []
         for track_name in track_names:
-            source_info = self._client.extract_info(track_name, download=False)
+            source_info = await self._extract(track_name)
 
-            if source_info is not None:
-                source_infos.append(source_info["entries"][0])
+            if source_info is not None and source_info.videos:
+                videos.append(source_info.videos[0])
 
-        return await self._batch_download(source_infos=source_infos, force_load_first=force_load_first)
+        return await self._batch_download(videos=videos, force_load_first=force_load_first, urgent=urgent)
 
-    async def _download(self, source_info: dict) -> Track:
-        file_path = self._cache_dir / f"{source_info['id']}{self.FILE_EXTENSION}"
-        if not file_path.exists():
-            self.__download_from_client(source_info["original_url"])
+    async def _extract(self, source: str, *, process: bool = True) -> SourceInfo | None:
+        with METADATA_LATENCY.time("youtube"), trace("youtube.extract", source=source, process=process):
+            if self._extraction_pool is not None:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._extraction_pool,
+                    partial(extract_in_worker, source, process=process),
+                )
+
+            return await asyncio.to_thread(extract_source_info, self._client, source, process=process)
+
+    async def _download(self, video: VideoInfo, *, urgent: bool) -> Track:
+        file_path = self._cache_dir / f"{video.id}{self.FILE_EXTENSION}"
+        if file_path.exists():
+            CACHE_REQUESTS.inc("youtube", "hit")
+        else:
+            CACHE_REQUESTS.inc("youtube", "miss")
+            with trace("youtube.download", video=video.id):
+                await self._download_pool.submit_blocking(self.__download_from_client, video, urgent=urgent)
 
         return Track(
-            id=source_info["id"],
-            title=source_info["title"].strip(),
-            link=source_info["original_url"].strip(),
-            duration=source_info["duration"],
+            id=video.id,
+            title=video.title,
+            link=video.url,
+            duration=video.duration,
             uuid=uuid.uuid4(),
             file_extension=self.FILE_EXTENSION,
         )
 
-    async def _batch_download(self, source_infos: list[dict], *, force_load_first: bool) -> list[Track]:
+    async def _batch_download(self, videos: list[VideoInfo], *, force_load_first: bool, urgent: bool) -> list[Track]:
         tracks = []
-        executor = Executor(thread_count=self._download_thread_count, loop=asyncio.get_event_loop())
 
         if force_load_first:
-            for source_info in source_infos[:2]:
-                url = source_info.get("webpage_url") or source_info["url"]
-
-                self.__download_from_client(url)
+            for video in videos[:2]:
+                with trace("youtube.download", video=video.id):
+                    await self._download_pool.submit_blocking(self.__download_from_client, video, urgent=urgent)
                 tracks.append(
                     Track(
-                        id=source_info["id"],
-                        title=source_info["title"].strip(),
-                        link=url.strip(),
-                        duration=source_info["duration"],
+                        id=video.id,
+                        title=video.title,
+                        link=video.url,
+                        duration=video.duration,
                         uuid=uuid.uuid4(),
                         file_extension=self.FILE_EXTENSION,
                     ),
                 )
 
-            source_infos = source_infos[2:]
-
-        for chunk in self._chunks(source_infos, len(source_infos) // self._download_thread_count + 1):
-            download_task = executor(
-                self.__batch_sync_download,
-                urls=(i.get("webpage_url") or i["url"] for i in chunk),
+            videos = videos[2:]
+
+        # Every video is a job of its own, so the pool interleaves them with downloads of other guilds
+        tracks.extend(
+            Track(
+                id=video.id,
+                title=video.title,
+                link=video.url,
+                duration=video.duration,
+                uuid=uuid.uuid4(),
+                download_task=self._download_pool.submit_blocking(self.__download_from_client, video),
+                file_extension=self.FILE_EXTENSION,
             )
-            for source_info in chunk:
-                url = source_info.get("webpage_url") or source_info["url"]
-                tracks.append(
-                    Track(
-                        id=source_info["id"],
-                        title=source_info["title"].strip(),
-                        link=url.strip(),
-                        duration=source_info["duration"],
-                        uuid=uuid.uuid4(),
-                        download_task=download_task,
-                        file_extension=self.FILE_EXTENSION,
-                    ),
-                )
+            for video in videos
+        )
 
         return tracks
 
-    def _chunks(self, lst: list, n: int) -> Generator:
-        for i in range(0, len(lst), n):
-            yield lst[i : i + n]
+    def __download_from_client(self, video: VideoInfo) -> None:
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            # yt-dlp continues .part files left by an interrupted attempt or a previous run with a Range request
+            if resumed_bytes := sum(i.stat().st_size for i in self._get_part_paths(video)):
+                RESUMED_BYTES.inc("youtube", amount=resumed_bytes)
+                logger.info("Resume %s from %s bytes", video.id, resumed_bytes)
 
-    def __batch_sync_download(self, urls: Iterable[str]) -> None:
-        for url in urls:
-            self.__download_from_client(url)
-
-    def __download_from_client(self, url: str) -> None:
-        while True:
             try:
-                self._client.download(url)
+                self._client.download(video.url)
             except youtube_dl.utils.DownloadError as e:
                 if "HTTP Error 416" in str(e):
-                    file_id = url.split("=")[-1]
-                    file_path = self._cache_dir / f"{file_id}{self.FILE_EXTENSION}"
-                    if file_path.exists():
-                        file_path.unlink()
-                else:
-                    time.sleep(5)
-                    continue
+                    # The parts don't match the file on the server anymore
+                    for part_path in self._get_part_paths(video):
+                        part_path.unlink(missing_ok=True)
+
+                # A video which can't be downloaded mustn't hold a pool worker forever
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    msg = f"Can't download {video.id}"
+                    raise CantDownloadError(msg) from None
+
+                time.sleep(RETRY_DELAY * attempt)
             else:
-                break
+                return
+
+    def _get_part_paths(self, video: VideoInfo) -> list[Path]:
+        return list(self._cache_dir.glob(f"{video.id}.*{PART_SUFFIX}"))
@@ -8,6 +8,9 @@ class SpotifyInfoLoader:
     def __init__(self, client_id: str, client_secret: str) -> None:
         self._client = SpotifyApiClient(client_id=client_id, client_secret=client_secret)
 
+    async def warm_up(self) -> None:
+        await self._client.fetch_token()
+
     async def get_track_names(self, source: str) -> list[str]:
         parsed_url = parse.urlparse(source)
         path_args = parsed_url.path.split("/")
@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from core.logging import logger
+from core.models import Track
+
+PLAY_HISTORY_FILE_NAME = ".history.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    guild_id INTEGER NOT NULL,
+    track_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    file_extension TEXT,
+    play_count INTEGER NOT NULL,
+    last_played_at REAL NOT NULL,
+    PRIMARY KEY (guild_id, track_id)
+) WITHOUT ROWID
+"""
+
+
+@dataclass(frozen=True)
+class PlayedTrack:
+    id: str
+    title: str
+    link: str
+    duration: int
+    file_extension: str | None
+    play_count: int
+
+
+class PlayHistory:
+    """How many times each track is played in each guild, one row per track and guild.
+
+    The database is next to the cached tracks and all queries run in one thread which owns the connection.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self._db_file = Path(cache_dir) / PLAY_HISTORY_FILE_NAME
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="play-history")
+        self._connection: sqlite3.Connection | None = None
+
+    async def record(self, guild_id: int, track: Track) -> None:
+        # Streams can't be cached, so they are not worth remembering
+        if track.stream_link:
+            return
+
+        try:
+            await self._execute(
+                """
+                INSERT INTO plays (
+                    guild_id, track_id, title, link, duration, file_extension, play_count, last_played_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (guild_id, track_id) DO UPDATE SET
+                    title = excluded.title,
+                    link = excluded.link,
+                    file_extension = excluded.file_extension,
+                    play_count = play_count + 1,
+                    last_played_at = excluded.last_played_at
+                """,
+                (guild_id, track.id, track.title, track.link, track.duration, track.file_extension, time.time()),
+            )
+        except sqlite3.Error:
+            logger.exception("Can't record play of %s", track.id)
+
+    async def get_guild_ids(self) -> list[int]:
+        rows = await self._execute("SELECT DISTINCT guild_id FROM plays")
+
+        return [i[0] for i in rows]
+
+    async def get_most_played(self, guild_id: int, limit: int) -> list[PlayedTrack]:
+        rows = await self._execute(
+            """
+            SELECT track_id, title, link, duration, file_extension, play_count
+            FROM plays
+            WHERE guild_id = ?
+            ORDER BY play_count DESC, last_played_at DESC
+            LIMIT ?
+            """,
+            (guild_id, limit),
+        )
+
+        return [PlayedTrack(*i) for i in rows]
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    async def _execute(self, query: str, parameters: tuple[Any, ...] = ()) -> list[tuple]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._execute_sync, query, parameters)
+
+    def _execute_sync(self, query: str, parameters: tuple[Any, ...]) -> list[tuple]:
+        if self._connection is None:
+            self._db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self._db_file)
+            self._connection.execute(SCHEMA)
+
+        with self._connection:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -4,10 +4,16 @@ from enum import Enum
 from pathlib import Path
 from typing import Any, Literal
 
-from discord import FFmpegPCMAudio, PCMVolumeTransformer, VoiceClient
+from discord import AudioSource, PCMVolumeTransformer, VoiceClient
 
 from config.settings import Settings
 from core.models import Track
+from core.tracing import trace
+from services.download_pool import DownloadPool
+from services.ffmpeg_governor import FFmpegGovernor, GovernedFFmpegOpusAudio, GovernedFFmpegPCMAudio
+from services.transcoder import OPUS_EXTENSION, get_cached_file
+
+FRAME_DURATION = 0.02
 
 
 class PlayerStatus(Enum):
@@ -16,11 +22,73 @@ class PlayerStatus(Enum):
     PAUSED = 2
 
 
+class PlaybackSource(AudioSource):
+    """Source of a track which counts the frames which are sent and can be suspended.
+
+    The position doesn't depend on the player, which is replaced on reconnects. A suspended source survives
+    the stop of the player: its ffmpeg process is kept and playing it again continues from the next frame.
+    """
+
+    def __init__(
+        self,
+        source: AudioSource,
+        ffmpeg_audio: GovernedFFmpegPCMAudio | GovernedFFmpegOpusAudio,
+        track: Track,
+        settings: tuple[int, int],
+    ) -> None:
+        self._source = source
+        self._ffmpeg_audio = ffmpeg_audio
+        self._suspended = False
+        self.track = track
+        # Bass and volume the source is created with
+        self.settings = settings
+        self.frames = 0
+
+    def read(self) -> bytes:
+        if data := self._source.read():
+            self.frames += 1
+
+        return data
+
+    def is_opus(self) -> bool:
+        return self._source.is_opus()
+
+    def suspend(self) -> None:
+        self._suspended = True
+        self._ffmpeg_audio.set_suspended(suspended=True)
+
+    def resume(self) -> None:
+        self._suspended = False
+        self._ffmpeg_audio.set_suspended(suspended=False)
+
+    def cleanup(self) -> None:
+        # Called by the player when it's stopped
+        if not self._suspended:
+            self._source.cleanup()
+
+    def close(self) -> None:
+        self._suspended = False
+        self._source.cleanup()
+
+
 class Player:
-    def __init__(self, voice_client: VoiceClient, settings: Settings) -> None:
+    def __init__(
+        self,
+        voice_client: VoiceClient,
+        settings: Settings,
+        ffmpeg_governor: FFmpegGovernor,
+        download_pool: DownloadPool,
+    ) -> None:
         self._status = PlayerStatus.NOT_PLAYING
         self._voice_client = voice_client
         self._settings = settings
+        self._ffmpeg_governor = ffmpeg_governor
+        self._download_pool = download_pool
+        self._source: PlaybackSource | None = None
+        self._suspended_source: PlaybackSource | None = None
+
+    def set_voice_client(self, voice_client: VoiceClient) -> None:
+        self._voice_client = voice_client
 
     def is_in_any_status(
         self, *statuses: Literal[PlayerStatus.PLAYING, PlayerStatus.NOT_PLAYING, PlayerStatus.PAUSED]
@@ -32,36 +100,122 @@ class Player:
         track: Track,
         on_music_end_callback: Callable[[Exception | None], None],
         on_success_play_callback: Callable,
+        *,
+        keep_suspended: bool = False,
     ) -> None:
         if not self.is_in_any_status(PlayerStatus.PLAYING, PlayerStatus.PAUSED):
+            if (source := self._take_suspended_source(track)) is not None:
+                # ffmpeg is alive and stopped at the next frame, -ss would re-open and re-decode the file
+                track.start_time = timedelta()
+
+                with trace("ffmpeg.resume", track=track.id):
+                    source.resume()
+                    self._source = source
+                    self._voice_client.play(source, after=on_music_end_callback)
+                self._status = PlayerStatus.PLAYING
+
+                await on_success_play_callback(is_resumed=True)
+
+                return
+
+            if not keep_suspended:
+                self.discard_suspended()
+
             if track.download_task:
-                await track.download_task
+                # A background download of the track may still be queued behind others
+                self._download_pool.promote(track.download_task)
+
+                with trace("player.wait_download", track=track.id):
+                    await track.download_task
+
+            with trace("ffmpeg.acquire"):
+                await self._ffmpeg_governor.acquire(self._voice_client.guild.id)
 
             track.im_start_time = track.start_time
             start_time = str(track.start_time)
             track.start_time = timedelta()
 
-            audio_kwargs: dict[str, Any] = {
-                "options": f"-af bass=g={self._settings.bass_value}",
-            }
-            if track.stream_link:
-                audio_kwargs["source"] = track.stream_link
-            else:
-                cached_file = Path(self._settings.cached_music_dir) / f"{track.id}{track.file_extension}"
-                audio_kwargs["source"] = str(cached_file)
-                audio_kwargs["before_options"] = f"-ss {start_time}"
-
-            self._voice_client.play(
-                PCMVolumeTransformer(
-                    FFmpegPCMAudio(**audio_kwargs),
-                    volume=self._settings.volume_value / 100,
-                ),
-                after=on_music_end_callback,
-            )
+            with trace("ffmpeg.start", track=track.id):
+                self._source = self._create_audio_source(track, start_time)
+                self._voice_client.play(self._source, after=on_music_end_callback)
             self._status = PlayerStatus.PLAYING
 
             await on_success_play_callback()
 
+    def suspend(self) -> None:
+        """Stop playing, but keep the source, so the track can be played again from the same frame."""
+        source = self._source
+
+        # A stream can't be paused for long, it's started again
+        if source is not None and not source.track.stream_link:
+            self.discard_suspended()
+            source.suspend()
+            self._suspended_source = source
+
+        self.stop()
+
+    def discard_suspended(self) -> None:
+        if self._suspended_source is not None:
+            self._suspended_source.close()
+            self._suspended_source = None
+
+    def _create_audio_source(self, track: Track, start_time: str) -> PlaybackSource:
+        audio_kwargs: dict[str, Any] = {
+            "options": f"-af bass=g={self._settings.bass_value}",
+            "governor": self._ffmpeg_governor,
+            "session": self._voice_client.guild.id,
+        }
+        if track.stream_link:
+            audio_kwargs["source"] = track.stream_link
+        else:
+            cached_file = get_cached_file(Path(self._settings.cached_music_dir), track.id, track.file_extension)
+            audio_kwargs["source"] = str(cached_file)
+            audio_kwargs["before_options"] = f"-ss {start_time}"
+
+            # Opus packets are sent as they are, without decoding and encoding them again, when there is no filter
+            if (
+                cached_file.suffix == OPUS_EXTENSION
+                and not self._settings.bass_value
+                and self._settings.volume_value == 100
+            ):
+                opus_audio = GovernedFFmpegOpusAudio(
+                    str(cached_file),
+                    codec="copy",
+                    before_options=f"-ss {start_time}",
+                    governor=self._ffmpeg_governor,
+                    session=self._voice_client.guild.id,
+                )
+
+                return PlaybackSource(opus_audio, opus_audio, track, self._get_audio_settings())
+
+        pcm_audio = GovernedFFmpegPCMAudio(**audio_kwargs)
+
+        return PlaybackSource(
+            PCMVolumeTransformer(pcm_audio, volume=self._settings.volume_value / 100),
+            pcm_audio,
+            track,
+            self._get_audio_settings(),
+        )
+
+    def _get_audio_settings(self) -> tuple[int, int]:
+        return self._settings.bass_value, self._settings.volume_value
+
+    def _take_suspended_source(self, track: Track) -> PlaybackSource | None:
+        source = self._suspended_source
+
+        if source is None or source.track is not track:
+            return None
+
+        self._suspended_source = None
+
+        # Filters are applied by ffmpeg, the source has to be created again with the new ones
+        if source.settings != self._get_audio_settings():
+            source.close()
+
+            return None
+
+        return source
+
     def stop(self) -> None:
         self._status = PlayerStatus.NOT_PLAYING
         self._voice_client.stop()
@@ -74,13 +228,13 @@ class Player:
         self._status = PlayerStatus.PLAYING
         self._voice_client.resume()
 
+    def get_position(self, track: Track) -> timedelta:
+        frames = self._source.frames if self._source is not None else 0
+
+        return track.im_start_time + timedelta(seconds=frames * FRAME_DURATION)
+
     def get_played_and_full_time(self, track: Track) -> tuple[timedelta, timedelta]:
-        current_time = timedelta(
-            seconds=int(
-                (self._voice_client._player.loops if self._voice_client._player is not None else 0) * 0.02  # noqa: SLF001
-                + track.im_start_time.total_seconds(),
-            )
-        )
+        current_time = timedelta(seconds=int(self.get_position(track).total_seconds()))
         full_time = timedelta(seconds=track.duration)
 
         return current_time, full_time
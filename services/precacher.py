@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from core.exceptions import CantDownloadError, CantLoadTrackInfoError
+from core.logging import logger
+from core.metrics import PRECACHED_BYTES, PRECACHED_TRACKS
+from services.download import DownloadService
+from services.download_pool import download_session
+from services.play_history import PlayedTrack, PlayHistory
+from services.transcoder import get_cached_file
+
+PRECACHE_INTERVAL = 15 * 60
+IDLE_CHECK_INTERVAL = 30.0
+TRACKS_PER_GUILD = 20
+MAX_BANDWIDTH = 1024 * 1024
+MAX_DISK_USAGE = 2 * 1024**3
+PRECACHE_SESSION = "precache"
+
+
+class PreCacher:
+    """Keeps the most played tracks of each guild downloaded, so requests for them always hit the cache.
+
+    Tracks are downloaded one by one and only while nothing is playing. Downloads are paced, so their average
+    rate stays under `max_bandwidth` bytes per second, and stop when the cache dir reaches `max_disk_usage`.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        play_history: PlayHistory,
+        download_service: DownloadService,
+        cache_dir: Path,
+        *,
+        tracks_per_guild: int = TRACKS_PER_GUILD,
+        max_bandwidth: int = MAX_BANDWIDTH,
+        max_disk_usage: int = MAX_DISK_USAGE,
+    ) -> None:
+        self._play_history = play_history
+        self._download_service = download_service
+        self._cache_dir = Path(cache_dir)
+        self._tracks_per_guild = tracks_per_guild
+        self._max_bandwidth = max_bandwidth
+        self._max_disk_usage = max_disk_usage
+
+    async def run(self, is_idle: Callable[[], bool]) -> None:
+        while True:
+            try:
+                await self.precache(is_idle)
+            except Exception:  # noqa: BLE001
+                logger.exception("Pre-caching failed")
+
+            await asyncio.sleep(PRECACHE_INTERVAL)
+
+    async def precache(self, is_idle: Callable[[], bool]) -> None:
+        for guild_id in await self._play_history.get_guild_ids():
+            for played_track in await self._play_history.get_most_played(guild_id, self._tracks_per_guild):
+                if await asyncio.to_thread(self._is_cached, played_track):
+                    continue
+
+                # Playback state has no events to wait for, it's rare to check anyway
+                while not is_idle():  # noqa: ASYNC110
+                    await asyncio.sleep(IDLE_CHECK_INTERVAL)
+
+                if await asyncio.to_thread(self._get_disk_usage) >= self._max_disk_usage:
+                    logger.info("Pre-caching is stopped, cache dir is full")
+
+                    return
+
+                await self._precache_track(played_track)
+
+    async def _precache_track(self, played_track: PlayedTrack) -> None:
+        started_at = time.monotonic()
+
+        try:
+            # Its own session, so pre-caching takes turns with the guilds instead of queueing in front of them,
+            # and not urgent, so it never takes the worker reserved for the tracks which are going to be played
+            with download_session(PRECACHE_SESSION):
+                tracks = await self._download_service.download(
+                    played_track.link,
+                    only_one=True,
+                    force_load_first=True,
+                    urgent=False,
+                )
+
+            for track in tracks:
+                if track.download_task is not None:
+                    await track.download_task
+        except (CantDownloadError, CantLoadTrackInfoError) as e:
+            PRECACHED_TRACKS.inc("error")
+            logger.warning("Can't pre-cache %s: %s", played_track.link, e)
+
+            return
+
+        size = await asyncio.to_thread(self._get_file_size, played_track)
+        PRECACHED_TRACKS.inc("success")
+        PRECACHED_BYTES.inc(amount=size)
+        logger.info("%s is pre-cached", played_track.title)
+
+        # The next download waits, so the average rate doesn't exceed the cap
+        await asyncio.sleep(max(size / self._max_bandwidth - (time.monotonic() - started_at), 0))
+
+    def _is_cached(self, played_track: PlayedTrack) -> bool:
+        return get_cached_file(self._cache_dir, played_track.id, played_track.file_extension).exists()
+
+    def _get_file_size(self, played_track: PlayedTrack) -> int:
+        try:
+            return get_cached_file(self._cache_dir, played_track.id, played_track.file_extension).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _get_disk_usage(self) -> int:
+        if not self._cache_dir.exists():
+            return 0
+
+        return sum(i.stat().st_size for i in self._cache_dir.iterdir() if i.is_file())
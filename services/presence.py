@@ -0,0 +1,55 @@
+import asyncio
+
+from discord import BaseActivity, Client, HTTPException, Status
+
+from core.logging import logger
+
+# Gateway allows only a few presence updates per 20 seconds
+PRESENCE_UPDATE_INTERVAL = 4.0
+
+
+class PresenceManager:
+    """Keeps only the latest desired presence and sends it not often than once per interval."""
+
+    def __init__(self, client: Client, update_interval: float = PRESENCE_UPDATE_INTERVAL) -> None:
+        self._client = client
+        self._update_interval = update_interval
+        self._desired: tuple[Status, BaseActivity | None] | None = None
+        self._current: tuple[Status, BaseActivity | None] | None = None
+        self._last_update_time: float | None = None
+        self._flush_task: asyncio.Task | None = None
+        self.sent_updates = 0
+        self.dropped_updates = 0
+
+    def update(self, activity: BaseActivity | None, status: Status = Status.online) -> None:
+        if self._desired is not None and self._desired != self._current:
+            self.dropped_updates += 1
+
+        self._desired = (status, activity)
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while self._desired is not None and self._desired != self._current:
+            if self._last_update_time is not None:
+                delay = self._last_update_time + self._update_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            desired = self._desired
+            if desired == self._current:
+                break
+
+            status, activity = desired
+            self._last_update_time = loop.time()
+
+            try:
+                await self._client.change_presence(status=status, activity=activity)
+            except (HTTPException, ConnectionError):
+                logger.exception("Can't change presence")
+            else:
+                self._current = desired
+                self.sent_updates += 1
@@ -11,12 +11,15 @@ class QueueManager:
         self._interrupting_track: Track | None = None
         self._is_looped: bool = False
         self._before_interruption_index: int = -1
+        self._version: int = 0
 
     def add_many(self, tracks: list[Track]) -> None:
         self._queue.extend(tracks)
+        self._version += 1
 
     def add_interruption(self, track: Track) -> None:
         self._interrupting_track = track
+        self._version += 1
 
     def clear(self) -> None:
         self._queue.clear()
@@ -24,6 +27,7 @@ class QueueManager:
         self._last_used_index = -1
         self._interrupting_track = None
         self._before_interruption_index = -1
+        self._version += 1
 
     def get_next(self) -> Track | None:
         next_index = self._get_next_index()
@@ -32,6 +36,7 @@ class QueueManager:
             self._interrupting_track = None
 
         self._current_index = next_index
+        self._version += 1
 
         if next_index != -1:
             self._last_used_index = self._current_index
@@ -53,6 +58,7 @@ class QueueManager:
             self._interrupting_track = None
 
         self._current_index = prev_index
+        self._version += 1
 
         if prev_index != -1:
             self._last_used_index = self._current_index
@@ -87,6 +93,7 @@ class QueueManager:
             self._current_index = index
             self._before_interruption_index = 0
             self._interrupting_track = None
+            self._version += 1
 
             return self._queue[index]
 
@@ -98,12 +105,17 @@ class QueueManager:
             if index <= self._current_index:
                 self._current_index -= 1
 
+            self._version += 1
+
             return removed
         return None
 
     def get_current_index(self) -> int:
         return self._current_index
 
+    def get_version(self) -> int:
+        return self._version
+
     def get_queue_length(self) -> int:
         return len(self._queue)
 
@@ -116,6 +128,8 @@ class QueueManager:
         return self._is_looped
 
     def shuffle(self) -> None:
+        self._version += 1
+
         if self._current_index > 0:
             current = self._queue.pop(self._current_index)
             random.shuffle(self._queue)
@@ -141,7 +155,7 @@ class QueueManager:
                 return next_index
 
         if self._last_used_index == -1:
-            return 0
+            return 0 if self._queue else -1
 
         if self._last_used_index + 1 < self.get_queue_length():
             return self._last_used_index + 1
@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib import parse
+
+from core.logging import logger
+from core.metrics import SOURCE_CACHE_REQUESTS
+from core.models import Track
+from services.transcoder import get_cached_file
+
+SOURCE_CACHE_FILE_NAME = ".sources.json"
+MAX_SOURCES = 10_000
+DUMP_DELAY = 5.0
+# Playlists and search results change, live stream links expire, cached files of tracks don't
+PLAYLIST_TTL = 6 * 3600
+SEARCH_TTL = 24 * 3600
+LIVE_TTL = 10 * 60
+
+
+@dataclass(frozen=True)
+class SourceKey:
+    key: str
+    is_playlist: bool = False
+    is_search: bool = False
+
+
+@dataclass
+class CachedTrack:
+    id: str
+    title: str
+    link: str
+    duration: int
+    file_extension: str | None = None
+    stream_link: str | None = None
+
+
+@dataclass
+class CachedSource:
+    tracks: list[CachedTrack]
+    expires_at: float | None = None
+    # Only the first track of a playlist is known, when it was resolved for an interruption
+    is_complete: bool = True
+
+
+def get_source_key(source: str) -> SourceKey:  # noqa: C901, PLR0911, PLR0912
+    """Canonical key, so different links to the same video or playlist share a cache entry."""
+    source = source.strip()
+    parsed_url = parse.urlparse(source)
+    netloc = parsed_url.netloc.lower().removeprefix("www.").removeprefix("m.")
+    query = parse.parse_qs(parsed_url.query)
+    path_args = [i for i in parsed_url.path.split("/") if i]
+
+    if netloc in {"youtube.com", "music.youtube.com", "youtu.be"}:
+        # yt-dlp resolves a video link with a list to the whole playlist
+        if list_id := query.get("list"):
+            return SourceKey(f"youtube:playlist:{list_id[0]}", is_playlist=True)
+
+        if netloc == "youtu.be" and len(path_args) == 1:
+            return SourceKey(f"youtube:{path_args[0]}")
+
+        if path_args == ["watch"] and (video_id := query.get("v")):
+            return SourceKey(f"youtube:{video_id[0]}")
+
+        if len(path_args) == 2 and path_args[0] in {"shorts", "live"}:
+            return SourceKey(f"youtube:{path_args[1]}")
+    elif netloc.startswith("music.yandex"):
+        if len(path_args) == 2 and path_args[0] == "album":
+            return SourceKey(f"yandex_music:album:{path_args[1]}", is_playlist=True)
+
+        if len(path_args) == 4 and path_args[0] == "album" and path_args[2] == "track":
+            return SourceKey(f"yandex_music:{path_args[3]}:{path_args[1]}")
+
+        if len(path_args) == 4 and path_args[0] == "users" and path_args[2] == "playlists":
+            return SourceKey(f"yandex_music:playlist:{path_args[1]}:{path_args[3]}", is_playlist=True)
+    elif netloc == "open.spotify.com":
+        # Localized links have an extra "intl-xx" part
+        for kind, spotify_id in itertools.pairwise(path_args):
+            if kind in {"track", "album", "playlist"}:
+                return SourceKey(f"spotify:{kind}:{spotify_id}", is_playlist=kind != "track")
+
+    if not parsed_url.scheme:
+        return SourceKey(f"search:{' '.join(source.lower().split())}", is_search=True)
+
+    # Anything else may turn out to be a playlist, so it gets the playlist TTL
+    return SourceKey(f"url:{source}", is_playlist=True)
+
+
+class SourceCache:
+    """Resolved sources, so known links go to the queue without extraction and network calls.
+
+    A source is served only when all its tracks are in the cache dir, so entries of removed tracks are dropped
+    when they are requested. Entries are kept in a dot file next to the cached tracks, which free_cache keeps.
+    """
+
+    def __init__(self, cache_dir: Path, max_sources: int = MAX_SOURCES) -> None:
+        self._cache_dir = Path(cache_dir)
+        self._cache_file = self._cache_dir / SOURCE_CACHE_FILE_NAME
+        self._max_sources = max_sources
+        self._sources: dict[str, CachedSource] = {}
+        self._dump_handle: asyncio.TimerHandle | None = None
+        self._dump_task: asyncio.Task | None = None
+        self._load()
+
+    async def get(self, source: str, *, only_one: bool = False) -> list[Track] | None:
+        source_key = get_source_key(source)
+        cached_source = self._sources.get(source_key.key)
+
+        if cached_source is not None and (
+            (cached_source.expires_at is not None and cached_source.expires_at < time.time())
+            or not await self._are_available(cached_source.tracks)
+        ):
+            # It may have been resolved again while the files were checked
+            if self._sources.get(source_key.key) is cached_source:
+                del self._sources[source_key.key]
+
+            cached_source = None
+
+        if cached_source is None or not (cached_source.is_complete or only_one):
+            SOURCE_CACHE_REQUESTS.inc("miss")
+
+            return None
+
+        SOURCE_CACHE_REQUESTS.inc("hit")
+        cached_tracks = cached_source.tracks[:1] if only_one else cached_source.tracks
+
+        return [
+            Track(
+                id=i.id,
+                title=i.title,
+                link=i.link,
+                duration=i.duration,
+                uuid=uuid.uuid4(),
+                stream_link=i.stream_link,
+                file_extension=i.file_extension,
+            )
+            for i in cached_tracks
+        ]
+
+    def put(self, source: str, tracks: list[Track], *, only_one: bool = False) -> None:
+        if not tracks:
+            return
+
+        source_key = get_source_key(source)
+        ttl = None
+        if any(i.stream_link for i in tracks):
+            ttl = LIVE_TTL
+        elif source_key.is_search:
+            ttl = SEARCH_TTL
+        elif source_key.is_playlist:
+            ttl = PLAYLIST_TTL
+
+        # Most recently resolved sources are at the end and survive eviction
+        self._sources.pop(source_key.key, None)
+        self._sources[source_key.key] = CachedSource(
+            tracks=[
+                CachedTrack(
+                    id=i.id,
+                    title=i.title,
+                    link=i.link,
+                    duration=i.duration,
+                    file_extension=i.file_extension,
+                    stream_link=i.stream_link,
+                )
+                for i in tracks
+            ],
+            expires_at=time.time() + ttl if ttl is not None else None,
+            is_complete=not (only_one and source_key.is_playlist),
+        )
+
+        while len(self._sources) > self._max_sources:
+            del self._sources[next(iter(self._sources))]
+
+        self._schedule_dump()
+
+    async def flush(self) -> None:
+        if self._dump_handle is not None:
+            self._dump_handle.cancel()
+            self._start_dump()
+
+        if self._dump_task is not None:
+            await self._dump_task
+
+    async def _are_available(self, tracks: list[CachedTrack]) -> bool:
+        # Streams have no files, the rest are checked in one go off the loop, a playlist is a lot of stat calls
+        if not (files := [i for i in tracks if i.stream_link is None]):
+            return True
+
+        return await asyncio.to_thread(self._are_cached, files)
+
+    def _are_cached(self, tracks: list[CachedTrack]) -> bool:
+        return all(get_cached_file(self._cache_dir, i.id, i.file_extension).exists() for i in tracks)
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self._cache_file.read_text(encoding="utf-8"))
+            self._sources = {
+                key: CachedSource(
+                    tracks=[CachedTrack(**i) for i in value["tracks"]],
+                    expires_at=value["expires_at"],
+                    is_complete=value["is_complete"],
+                )
+                for key, value in data.items()
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning("Can't load source cache: %s", e)
+
+    def _schedule_dump(self) -> None:
+        if self._dump_handle is not None:
+            self._dump_handle.cancel()
+
+        self._dump_handle = asyncio.get_running_loop().call_later(DUMP_DELAY, self._start_dump)
+
+    def _start_dump(self) -> None:
+        self._dump_handle = None
+        now = time.time()
+        text = json.dumps(
+            {
+                key: asdict(value)
+                for key, value in self._sources.items()
+                if value.expires_at is None or value.expires_at > now
+            }
+        )
+        previous_task = self._dump_task
+        self._dump_task = asyncio.create_task(self._dump(text, previous_task))
+
+    async def _dump(self, text: str, previous_task: asyncio.Task | None) -> None:
+        # Writes go one after another, so an older snapshot never replaces a newer one
+        if previous_task is not None:
+            await previous_task
+
+        try:
+            await asyncio.to_thread(self._write, text)
+        except OSError:
+            logger.exception("Can't dump source cache")
+
+    def _write(self, text: str) -> None:
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=self._cache_dir,
+            prefix=f"{SOURCE_CACHE_FILE_NAME}.",
+            delete=False,
+        ) as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        Path(temp_file.name).replace(self._cache_file)
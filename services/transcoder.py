@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+from pathlib import Path
+
+from core.logging import logger
+from core.metrics import TRANSCODE_LATENCY, TRANSCODES
+from core.priority import lower_process_priority
+
+OPUS_EXTENSION = ".opus"
+TRANSCODING_SUFFIX = ".transcoding"
+TRANSCODED_EXTENSIONS = (".mp3",)
+SAMPLE_RATE = 48000
+BITRATE = "128k"
+
+
+def get_cached_file(cache_dir: Path, track_id: str, file_extension: str | None) -> Path:
+    """Opus version of a cached track when it's transcoded already, otherwise the file as it was downloaded."""
+    opus_file = Path(cache_dir) / f"{track_id}{OPUS_EXTENSION}"
+    if opus_file.exists():
+        return opus_file
+
+    return Path(cache_dir) / f"{track_id}{file_extension or ''}"
+
+
+class Transcoder:
+    """Converts cached tracks to 48 kHz Ogg Opus in background, so the player can send them without re-encoding.
+
+    At most `processes` niced ffmpeg processes run at once. A converted file is renamed into place and only then
+    the original is removed, both on the event loop, so the player opens either of them but never a partial file.
+    """
+
+    def __init__(self, cache_dir: Path, processes: int = 1) -> None:
+        self._cache_dir = Path(cache_dir)
+        self._semaphore = asyncio.Semaphore(max(processes, 1))
+        self._tasks: dict[Path, asyncio.Task] = {}
+
+    def schedule(self, file_path: Path) -> None:
+        if file_path.suffix == OPUS_EXTENSION or file_path in self._tasks:
+            return
+
+        task = asyncio.create_task(self._transcode(file_path))
+        self._tasks[file_path] = task
+        task.add_done_callback(lambda _: self._tasks.pop(file_path, None))
+
+    async def schedule_pending(self) -> None:
+        """Schedule the cached files which were downloaded before or while the bot was stopped."""
+
+        def find_pending() -> list[Path]:
+            # Conversions interrupted by a restart start over
+            for temp_path in self._cache_dir.glob(f"*{TRANSCODING_SUFFIX}"):
+                temp_path.unlink(missing_ok=True)
+
+            return list(
+                itertools.chain.from_iterable(self._cache_dir.glob(f"*{i}") for i in TRANSCODED_EXTENSIONS),
+            )
+
+        for file_path in await asyncio.to_thread(find_pending):
+            self.schedule(file_path)
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _transcode(self, file_path: Path) -> None:
+        async with self._semaphore:
+            if not await asyncio.to_thread(file_path.exists):
+                return
+
+            opus_path = file_path.with_suffix(OPUS_EXTENSION)
+            temp_path = opus_path.with_name(f"{opus_path.name}{TRANSCODING_SUFFIX}")
+
+            with TRANSCODE_LATENCY.time():
+                process = await asyncio.create_subprocess_exec(
+                    "ffmpeg",
+                    "-nostdin",
+                    "-loglevel",
+                    "error",
+                    "-y",
+                    "-i",
+                    str(file_path),
+                    "-vn",
+                    "-threads",
+                    "1",
+                    "-c:a",
+                    "libopus",
+                    "-b:a",
+                    BITRATE,
+                    "-ar",
+                    str(SAMPLE_RATE),
+                    "-f",
+                    "ogg",
+                    str(temp_path),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                lower_process_priority(process.pid)
+
+                try:
+                    _, stderr = await process.communicate()
+                except asyncio.CancelledError:
+                    process.kill()
+                    await process.wait()
+                    temp_path.unlink(missing_ok=True)
+                    raise
+
+            if process.returncode != 0:
+                TRANSCODES.inc("error")
+                temp_path.unlink(missing_ok=True)
+                logger.warning("Can't transcode %s: %s", file_path.name, stderr.decode(errors="replace").strip())
+
+                return
+
+            # Swapped on the event loop, so the player always finds one of the files
+            temp_path.replace(opus_path)
+            file_path.unlink(missing_ok=True)  # noqa: ASYNC240
+            TRANSCODES.inc("success")
+            logger.debug("%s is transcoded to opus", file_path.name)